@@ -1,174 +1,98 @@
 import sys
+import argparse
 import torch
 import torch.nn as nn
 import torch.optim as optim
-import numpy as np
-import matplotlib.pyplot as plt
 from pathlib import Path
 sys.path.append(str(Path(__file__).resolve().parent.parent))
-from data.MLP_data_processing import load_and_process_data
+from MLP.MLP1_network import FullyConnected
+from training.trainer import train_model
+from training.checkpoint import save_scalers
+from utils.profiling import RunProfiler
+from evaluation.metrics import predict, threshold_accuracy, average_percentage_error
 
-batch_size = 32    # Batch size for training
-
-# ===== Loading, Processing and Normalizing the Dataset =====
-train_loader, val_loader, test_loader, features, target = load_and_process_data('XAU_1d_data.csv', batch_size)
+# Importing this file only defines the settings and the model: run it (or call main()) to train and test it.
+# The data loaders (pandas, sklearn) and matplotlib are imported by main().
 
+batch_size = 32    # Batch size for training
+profile = False     # Record the time, throughput and memory of each phase in models/<name>_profile.json
+profile_epochs = None    # e.g. (2, 3) to also save a torch profiler trace of these epochs
 
-# ===== Building the MLP Model =====
-class FullyConnected(nn.Module):
-    def __init__(self, input_size, hidden_size, output_size):
-        super(FullyConnected, self).__init__()
-        self.fc1 = nn.Linear(input_size, hidden_size)
-        #self.relu = nn.ReLU()
-        # self.relu = nn.LeakyReLU()
-        self.relu = nn.ELU()
-        self.fc2 = nn.Linear(hidden_size, output_size)
-
-    def forward(self, x):
-        out = self.fc1(x)
-        out = self.relu(out)
-        out = self.fc2(out)
-        return out
-
-input_size = len(features)
+# ===== Model and Training Settings =====
 hidden_size = 64
 output_size = 1
 lr = 0.001
-
-model = FullyConnected(input_size, hidden_size, output_size)
-#criterion = nn.MSELoss()
-criterion = nn.SmoothL1Loss()
-optimizer = optim.Adam(model.parameters(), lr)
-#optimizer = optim.RMSprop(model.parameters(), lr)
-
-
-# ===== Training the Model =====
-def train_model(model, train_loader, val_loader, criterion, optimizer, num_epochs, patience):
-    train_losses = []
-    val_losses = []
-    best_val_loss = float('inf')
-    epochs_no_improve = 0
-    best_model_state = None
-
-    for epoch in range(num_epochs):
-        model.train()
-        train_loss = 0.0
-        for xb, yb in train_loader:
-            optimizer.zero_grad()
-            output = model(xb)
-            loss = criterion(output, yb)
-            loss.backward()
-            optimizer.step()
-            train_loss += loss.item()
-
-        train_loss /= len(train_loader)
-        train_losses.append(train_loss)
-
-        model.eval()
-        val_loss = 0.0
-        with torch.no_grad():
-            for xb, yb in val_loader:
-                output = model(xb)
-                loss = criterion(output, yb)
-                val_loss += loss.item()
-
-        val_loss /= len(val_loader)
-        val_losses.append(val_loss)
-
-        print(f"Epoch {epoch+1}/{num_epochs}, Train Loss: {train_loss:.6f}, Val Loss: {val_loss:.6f}")
-
-        # Early stopping
-        if val_loss < best_val_loss:
-            best_val_loss = val_loss
-            epochs_no_improve = 0
-            best_model_state = model.state_dict()
-            print("New best val_loss. Model weights saved in memory.")
-        else:
-            epochs_no_improve += 1
-            print(f"No improvement: {epochs_no_improve}/{patience}")
-            if epochs_no_improve >= patience:
-                print(f"Early stopping triggered at epoch {epoch+1}.")
-                break
-    
-    # Model checkpointing             
-    if best_model_state is not None:
-        model_path = (Path(__file__).resolve().parent.parent / 'models' / 'MLP1_model.pth').as_posix()
-        Path(model_path).parent.mkdir(parents=True, exist_ok=True)
-        torch.save(best_model_state, model_path)
-        print("Best model weights saved to disk.")
-
-    return train_losses, val_losses
-
-# Start training
 num_epochs = 500
 patience = 30
-train_losses, val_losses = train_model(model, train_loader, val_loader, criterion, optimizer, num_epochs, patience)
+resume = False    # Continue an interrupted run from its last checkpoint
+starting_epoch = 30  # Start plotting the losses from this epoch for graphic reasons
+model_path = (Path(__file__).resolve().parent.parent / 'models' / 'MLP1_model.pth').as_posix()
 
 
-# ===== Plotting the Losses =====
-starting_epoch = 30  # Start plotting from this epoch for graphic reasons
-plt.figure(figsize=(12,6))
-plt.plot(range(starting_epoch, len(train_losses) + 1), train_losses[starting_epoch-1:], label='Train Loss', marker='o')
-plt.plot(range(starting_epoch, len(val_losses) + 1), val_losses[starting_epoch-1:], label='Validation Loss', marker='s')
-plt.legend()
-plt.xlabel('Epochs')
-plt.ylabel('Loss')
-plt.title(f'Training and Validation Loss (excluding first {starting_epoch} epochs for graphic reasons) - MLP1')
-plt.show()
+# ===== Building the MLP Model =====
+def build_model(input_size):
+    model = FullyConnected(input_size, hidden_size, output_size)
+    #criterion = nn.MSELoss()
+    criterion = nn.SmoothL1Loss()
+    optimizer = optim.Adam(model.parameters(), lr)
+    #optimizer = optim.RMSprop(model.parameters(), lr)
+    return model, criterion, optimizer
 
 
-# ===== Testing the Model =====
-# Load the best model weights
-model_path = (Path(__file__).resolve().parent.parent / 'models' / 'MLP1_model.pth').as_posix()
-model.load_state_dict(torch.load(model_path, weights_only=False))
-
-# Evaluate the model on the test set
-model.eval()
-predictions = []
-actuals = []
-test_loss = 0.0
-with torch.no_grad():
-    for xb, yb in test_loader:
-        output = model(xb).squeeze()  # squeeze to remove extra dimension
-        yb = yb.squeeze()             # and have them as a 1D tensor already
-        test_loss += criterion(output, yb).item()
-        predictions.extend(output.tolist())
-        actuals.extend(yb.tolist())
-
-test_loss /= len(test_loader)
-print(f'\nMSE Loss - Test set (MLP1 - 2 layers): {test_loss:.6f}')
-
-
-# ===== Accuracy-based Loss Calculation =====
-def accuracy_based_loss(predictions, targets, threshold):
-    corrects = 0
-    for i in range(len(predictions)):
-        if abs(predictions[i] - targets[i]) <= threshold/100 * targets[i]:
-            corrects += 1
-    accuracy = corrects / len(predictions)
-    print(f"Correct predictions: {corrects}, Total predictions: {len(predictions)}")
+# headless: save the figures to models/MLP1_<figure>.png instead of showing them
+def main(headless=False):
+    from data.MLP_data_processing import load_and_process_data
+    from evaluation.plotting import FigureWriter, plot_losses, plot_predictions
+
+    profiler = RunProfiler(enabled=profile, trace_epochs=profile_epochs)
+    figures = FigureWriter(model_path if headless else None)
+
+    # ===== Loading, Processing and Normalizing the Dataset =====
+    train_loader, val_loader, test_loader, features, target, scaler = load_and_process_data('XAU_1d_data.csv', batch_size, profiler=profiler)
+    model, criterion, optimizer = build_model(len(features))
+
+
+    # ===== Training the Model =====
+    save_scalers(model_path, features, scaler)
+    with profiler.phase('train'):
+        train_losses, val_losses = train_model(model, train_loader, val_loader, criterion, optimizer, num_epochs, patience, model_path, resume=resume, profiler=profiler)
+
+
+    # ===== Plotting the Losses =====
+    figures.plot('losses', plot_losses, train_losses, val_losses, starting_epoch,
+                 f'Training and Validation Loss (excluding first {starting_epoch} epochs for graphic reasons) - MLP1')
+
+
+    # ===== Testing the Model =====
+    # Load the best model weights
+    model.load_state_dict(torch.load(model_path, weights_only=False))
+
+    # Evaluate the model on the test set
+    with profiler.phase('test', samples=len(test_loader.dataset)):
+        predictions, actuals, test_loss = predict(model, test_loader, criterion)
+    print(f'\nMSE Loss - Test set (MLP1 - 2 layers): {test_loss:.6f}')
+
+
+    # ===== Accuracy-based Loss Calculation =====
+    threshold = 1 # % threshold for accuracy
+    corrects, total, accuracy = threshold_accuracy(predictions, actuals, threshold)
+    print(f"Correct predictions: {corrects}, Total predictions: {total}")
     print(f'\nAccuracy - Test set (MLP1 - 2 layers): {accuracy*100:.4f}% of correct predictions within {threshold}%')
-threshold = 1 # % threshold for accuracy
-accuracy_based_loss(predictions, actuals, threshold)
 
 
-# ===== Average Percentage % Error Calculation =====
-def average_percentage_error(predictions, actuals):
-    predictions = np.array(predictions)
-    actuals = np.array(actuals)
-    percent_errors = np.abs((predictions - actuals) / actuals) * 100
-    avg_percent_error = np.mean(percent_errors)
+    # ===== Average Percentage % Error Calculation =====
+    avg_percent_error = average_percentage_error(predictions, actuals)
     print(f'\nAverage % Error - Test set (MLP1 - 2 layers): {avg_percent_error:.4f}% of average error')
-percentage_error = average_percentage_error(predictions, actuals)
-
-
-# ===== Plotting Predictions vs Actuals values =====
-plt.figure(figsize=(12, 6))
-plt.plot(actuals, label='Actual', color='blue')
-plt.plot(predictions, label='Predicted', color='red')
-plt.xlabel("Time")
-plt.ylabel("Price")
-plt.title("Actual vs Predicted Prices - MLP1")
-plt.legend()
-plt.grid(True)
-plt.show()
\ No newline at end of file
+
+
+    # ===== Plotting Predictions vs Actuals values =====
+    figures.plot('predictions', plot_predictions, actuals, predictions, "Actual vs Predicted Prices - MLP1")
+
+    profiler.save(model_path)
+    figures.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train the MLP1 model and evaluate it on the test set.')
+    parser.add_argument('--headless', action='store_true', help='Save the figures to models/ instead of showing them')
+    main(parser.parse_args().headless)
@@ -0,0 +1,17 @@
+import torch.nn as nn
+
+
+# ===== Building the MLP Model =====
+class FullyConnected(nn.Module):
+    # activation: nn.ELU, nn.ReLU or nn.LeakyReLU
+    def __init__(self, input_size, hidden_size, output_size, activation=nn.ELU):
+        super(FullyConnected, self).__init__()
+        self.fc1 = nn.Linear(input_size, hidden_size)
+        self.relu = activation()
+        self.fc2 = nn.Linear(hidden_size, output_size)
+
+    def forward(self, x):
+        out = self.fc1(x)
+        out = self.relu(out)
+        out = self.fc2(out)
+        return out
@@ -0,0 +1,21 @@
+import torch.nn as nn
+
+
+# ===== Building the MLP Model =====
+class FullyConnected(nn.Module):
+    # activation: nn.ReLU, nn.LeakyReLU or nn.ELU
+    def __init__(self, input_size, hidden_size1, hidden_size2, output_size, activation=nn.ReLU):
+        super(FullyConnected, self).__init__()
+        self.fc1 = nn.Linear(input_size, hidden_size1)
+        self.relu1 = activation()
+        self.fc2 = nn.Linear(hidden_size1, hidden_size2)
+        self.relu2 = activation()
+        self.fc3 = nn.Linear(hidden_size2, output_size)
+
+    def forward(self, x):
+        out = self.fc1(x)
+        out = self.relu1(out)
+        out = self.fc2(out)
+        out = self.relu2(out)
+        out = self.fc3(out)
+        return out
@@ -0,0 +1,17 @@
+import torch.nn as nn
+
+
+# ===== Building the RNN Model =====
+class RNN(nn.Module):
+    # nonlinearity: 'tanh' or 'relu'
+    def __init__(self, input_size, hidden_size, num_layers, output_size, nonlinearity='tanh'):
+        super(RNN, self).__init__()
+        self.rnn = nn.RNN(input_size, hidden_size, num_layers, nonlinearity=nonlinearity, batch_first=True)
+        self.fc = nn.Linear(hidden_size, output_size)
+
+    def forward(self, x):
+        out, _ = self.rnn(x)       
+        out = out[:, -1, :]            
+        out = self.fc(out)             
+        out = out.unsqueeze(-1)    # (batch_size, pred_len, 1) to match yb shape
+        return out
@@ -0,0 +1,260 @@
+import sys
+import json
+import time
+import shutil
+import argparse
+import itertools
+import subprocess
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from benchmarks.synthetic import TIMEFRAMES, generate_ohlcv, write_kaggle_csv
+from utils.profiling import current_rss_mb, peak_rss_mb, environment
+
+root_dir = Path(__file__).resolve().parent.parent
+dataset_dir = root_dir / 'data' / 'dataset'
+results_dir = Path(__file__).resolve().parent / 'results'
+
+
+def bench_file(timeframe):
+    return f'BENCH_{timeframe}_data.csv'
+
+
+# ===== Benchmarks =====
+# Each benchmark prepares its inputs, then times only the measured step. It returns the number of items processed
+# (rows, windows or samples), the seconds it took and any extra figures.
+# The indicator kernel; 'mismatches' counts the values that differ from the pandas definitions (NaN == NaN)
+def bench_indicators(timeframe, rows, settings):
+    import numpy as np
+    from data.data_preparation import add_indicators, add_indicators_pandas
+    from data.indicator_engine import INDICATOR_COLUMNS
+    data = generate_ohlcv(rows, timeframe).drop(columns='Date')
+    start = time.perf_counter()
+    result = add_indicators(data)
+    seconds = time.perf_counter() - start
+    computed = result[INDICATOR_COLUMNS].to_numpy()
+    expected = add_indicators_pandas(data.copy())[INDICATOR_COLUMNS].to_numpy()
+    mismatches = int((~((computed == expected) | (np.isnan(computed) & np.isnan(expected)))).sum())
+    return {'items': rows, 'seconds': seconds, 'mismatches': mismatches}
+
+
+# The same indicators with one pandas operation (and one DataFrame column) at a time
+def bench_indicators_pandas(timeframe, rows, settings):
+    from data.data_preparation import add_indicators_pandas
+    data = generate_ohlcv(rows, timeframe).drop(columns='Date')
+    start = time.perf_counter()
+    add_indicators_pandas(data)
+    return {'items': rows, 'seconds': time.perf_counter() - start}
+
+
+# Full preparation of a downloaded file (read, clean, indicators, CSV and binary store); the file is kept for the next benchmarks
+def bench_prepare_file(timeframe, rows, settings):
+    from data.data_preparation import prepare_file
+    file = write_kaggle_csv(generate_ohlcv(rows, timeframe), dataset_dir / bench_file(timeframe))
+    start = time.perf_counter()
+    prepare_file(file)
+    return {'items': rows, 'seconds': time.perf_counter() - start}
+
+
+# The data loaders import sklearn on their first call: it is imported before the timer, so only the loading is measured
+def bench_load_mlp(timeframe, rows, settings):
+    import sklearn.preprocessing
+    from data.MLP_data_processing import load_and_process_data
+    start = time.perf_counter()
+    train_loader, _, _, _, _, _ = load_and_process_data(bench_file(timeframe), 32)
+    return {'items': len(train_loader.dataset), 'seconds': time.perf_counter() - start}
+
+
+def bench_load_rnn(timeframe, rows, settings):
+    import sklearn.preprocessing
+    from data.RNN_data_processing import load_and_process_data
+    start = time.perf_counter()
+    train_loader, _, _, _, _, _, _ = load_and_process_data(bench_file(timeframe), 30, 7, 128)
+    return {'items': len(train_loader.dataset), 'seconds': time.perf_counter() - start}
+
+
+def bench_create_sequences(timeframe, rows, settings):
+    import numpy as np
+    from data.RNN_data_processing import create_sequences
+    data = np.random.default_rng(0).random((rows, 11))
+    target = data[:, :1]
+    start = time.perf_counter()
+    sequences, targets = create_sequences(data, target, 30, 7)
+    # Materialize one batch of windows, as the training loop does
+    np.ascontiguousarray(sequences[:128])
+    return {'items': len(sequences), 'seconds': time.perf_counter() - start}
+
+
+# One pass over the RNN training batches, without the model
+def bench_rnn_batches(timeframe, rows, settings):
+    from data.RNN_data_processing import load_and_process_data
+    train_loader, _, _, _, _, _, _ = load_and_process_data(bench_file(timeframe), 30, 7, 128)
+    start = time.perf_counter()
+    for _ in train_loader:
+        pass
+    return {'items': len(train_loader.dataset), 'seconds': time.perf_counter() - start}
+
+
+# A fixed number of optimizer steps (forward, backward and update), cycling over the training batches
+def train_steps(model, loader, steps):
+    import torch
+    criterion = torch.nn.MSELoss()
+    optimizer = torch.optim.Adam(model.parameters(), 0.001)
+    samples = 0
+    start = time.perf_counter()
+    for xb, yb in itertools.islice(itertools.cycle(loader), steps):
+        optimizer.zero_grad(set_to_none=True)
+        loss = criterion(model(xb), yb)
+        loss.backward()
+        optimizer.step()
+        samples += len(xb)
+    seconds = time.perf_counter() - start
+    return {'items': samples, 'seconds': seconds, 'steps_per_sec': steps / seconds}
+
+
+def bench_train_mlp(timeframe, rows, settings):
+    from data.MLP_data_processing import load_and_process_data
+    from MLP.MLP2_network import FullyConnected
+    train_loader, _, _, features, _, _ = load_and_process_data(bench_file(timeframe), 32)
+    return train_steps(FullyConnected(len(features), 64, 32, 1), train_loader, settings['steps'])
+
+
+def bench_train_rnn(timeframe, rows, settings):
+    from data.RNN_data_processing import load_and_process_data
+    from RNN.RNN_network import RNN
+    train_loader, _, _, features, pred_len, _, _ = load_and_process_data(bench_file(timeframe), 30, 7, 128)
+    return train_steps(RNN(len(features), 64, 1, pred_len), train_loader, settings['steps'])
+
+
+# Test set evaluation of a multi-step RNN: predictions, inverse scaling, accuracy, % error and overlap averaging
+def bench_metrics(timeframe, rows, settings):
+    import torch
+    from data.RNN_data_processing import load_and_process_data
+    from RNN.RNN_network import RNN
+    from evaluation.metrics import predict, inverse_transform, threshold_accuracy, average_percentage_error
+    from evaluation.aggregation import averaged_predictions_per_time_step
+    _, _, test_loader, features, pred_len, _, target_scaler = load_and_process_data(bench_file(timeframe), 30, 7, 128)
+    model = RNN(len(features), 64, 1, pred_len)
+    start = time.perf_counter()
+    predictions, actuals, _ = predict(model, test_loader, torch.nn.MSELoss())
+    predictions = inverse_transform(predictions, target_scaler)
+    actuals = inverse_transform(actuals, target_scaler)
+    threshold_accuracy(predictions, actuals, 1)
+    average_percentage_error(predictions, actuals)
+    averaged_predictions_per_time_step(predictions)
+    return {'items': len(predictions), 'seconds': time.perf_counter() - start}
+
+
+# In running order: prepare_file writes the file the later benchmarks load
+BENCHMARKS = {
+    'indicators': bench_indicators,
+    'indicators_pandas': bench_indicators_pandas,
+    'prepare_file': bench_prepare_file,
+    'load_mlp': bench_load_mlp,
+    'load_rnn': bench_load_rnn,
+    'create_sequences': bench_create_sequences,
+    'rnn_batches': bench_rnn_batches,
+    'train_mlp': bench_train_mlp,
+    'train_rnn': bench_train_rnn,
+    'metrics': bench_metrics,
+}
+USES_PREPARED_FILE = {'load_mlp', 'load_rnn', 'rnn_batches', 'train_mlp', 'train_rnn', 'metrics'}
+
+
+# ===== Runner =====
+# Every benchmark runs in a fresh process, so that its peak memory is not hidden by the previous ones
+def run_isolated(name, timeframe, rows, settings):
+    import torch
+    torch.set_num_threads(settings['threads'])
+    baseline = current_rss_mb()
+    result = BENCHMARKS[name](timeframe, rows, settings)
+    result.update({
+        'benchmark': name,
+        'timeframe': timeframe,
+        'rows': rows,
+        'items_per_sec': result['items'] / result['seconds'],
+        'baseline_rss_mb': baseline,
+        'peak_rss_mb': peak_rss_mb(),
+    })
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root_dir, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Fastest of `repeat` runs of a benchmark
+def run_best(name, timeframe, rows, settings, context):
+    best = None
+    for _ in range(settings['repeat']):
+        with ProcessPoolExecutor(1, mp_context=context) as executor:
+            result = executor.submit(run_isolated, name, timeframe, rows, settings).result()
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+    return best
+
+
+def run_benchmarks(names, timeframes, settings, rows=None, keep_files=False):
+    results = []
+    context = mp.get_context('spawn')
+    try:
+        for timeframe in timeframes:
+            num_rows = rows or TIMEFRAMES[timeframe][1]
+            for name in names:
+                # The benchmarks that load the prepared file need prepare_file to have run first
+                if name in USES_PREPARED_FILE and not (dataset_dir / bench_file(timeframe)).exists():
+                    run_best('prepare_file', timeframe, num_rows, dict(settings, repeat=1), context)
+                result = run_best(name, timeframe, num_rows, settings, context)
+                results.append(result)
+                print(f"{timeframe:>4} {name:<17} {result['seconds']:9.3f}s {result['items_per_sec']:14,.0f} items/s   peak RSS {result['peak_rss_mb']:8.0f} MB")
+    finally:
+        if not keep_files:
+            for timeframe in timeframes:
+                (dataset_dir / bench_file(timeframe)).unlink(missing_ok=True)
+                shutil.rmtree(dataset_dir / '.store' / Path(bench_file(timeframe)).stem, ignore_errors=True)
+    return results
+
+
+# Seconds and peak memory of the new results relative to a previous results file
+def compare(previous, results):
+    before = {(r['benchmark'], r['timeframe']): r for r in previous['results']}
+    print(f"\nCompared with {previous.get('commit')} ({previous.get('date')}):")
+    for result in results:
+        old = before.get((result['benchmark'], result['timeframe']))
+        if old is not None:
+            print(f"{result['timeframe']:>4} {result['benchmark']:<17} time x{result['seconds'] / old['seconds']:.2f}   "
+                  f"peak RSS x{result['peak_rss_mb'] / old['peak_rss_mb']:.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the data pipeline and the models on synthetic datasets.')
+    parser.add_argument('--timeframes', nargs='+', default=['1d', '1h'], choices=list(TIMEFRAMES), help='Dataset sizes to run (default: 1d 1h)')
+    parser.add_argument('--rows', type=int, help='Number of bars, instead of about 20 years of each time frame')
+    parser.add_argument('--benchmarks', nargs='+', default=list(BENCHMARKS), choices=list(BENCHMARKS))
+    parser.add_argument('--steps', type=int, default=200, help='Optimizer steps of the training benchmarks')
+    parser.add_argument('--threads', type=int, default=1, help='Torch threads')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs of each benchmark, the fastest is kept')
+    parser.add_argument('--output', help='Results file (default: benchmarks/results/<commit>_<date>.json)')
+    parser.add_argument('--compare', help='Previous results file to compare with')
+    parser.add_argument('--keep-files', action='store_true', help='Keep the synthetic datasets in data/dataset')
+    args = parser.parse_args()
+
+    settings = {'steps': args.steps, 'threads': args.threads, 'repeat': args.repeat}
+    names = [name for name in BENCHMARKS if name in args.benchmarks]
+    results = run_benchmarks(names, args.timeframes, settings, args.rows, args.keep_files)
+
+    commit = git_commit()
+    date = time.strftime('%Y-%m-%d %H:%M:%S')
+    output = Path(args.output) if args.output else results_dir / f"{commit or 'unknown'}_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({'commit': commit, 'date': date, 'environment': environment(), 'settings': settings, 'results': results}, f, indent=2)
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
@@ -0,0 +1,60 @@
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# Bar period and number of bars of about 20 years of XAU/USD data (trading days only) for each time frame
+TIMEFRAMES = {
+    '1d': ('1D', 5_000),
+    '4h': ('4h', 30_000),
+    '1h': ('1h', 120_000),
+    '15m': ('15min', 480_000),
+    '5m': ('5min', 1_400_000),
+    '1m': ('1min', 7_000_000),
+}
+
+
+# ===== Synthetic OHLCV Series =====
+# Geometric random walk starting from the 2004 gold price, with High/Low around Open/Close and random volumes.
+# The volatility of a bar scales with the square root of its length, so all the time frames look alike.
+def generate_ohlcv(num_rows, timeframe='1d', seed=0, start='2004-06-11'):
+    freq = TIMEFRAMES[timeframe][0]
+    rng = np.random.default_rng(seed)
+    bar_volatility = 0.01 * np.sqrt(pd.Timedelta(freq) / pd.Timedelta('1D'))
+    close = 400 * np.exp(np.cumsum(rng.normal(0, bar_volatility, num_rows)))
+    open_ = np.concatenate(([close[0]], close[:-1]))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, bar_volatility / 2, num_rows))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, bar_volatility / 2, num_rows))
+    return pd.DataFrame({
+        'Date': pd.date_range(start, periods=num_rows, freq=freq),
+        'Open': open_.round(3),
+        'High': high.round(3),
+        'Low': low.round(3),
+        'Close': close.round(3),
+        'Volume': rng.integers(100, 10_000, num_rows),
+    })
+
+
+# Write the series like the Kaggle files ('Date;Open;High;Low;Close;Volume', dates as 2004.06.11 00:00),
+# in chunks so that tens of millions of rows do not need to be formatted at once
+def write_kaggle_csv(data, path, chunksize=1_000_000):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for start in range(0, len(data), chunksize):
+        chunk = data.iloc[start:start + chunksize].copy()
+        chunk['Date'] = chunk['Date'].dt.strftime('%Y.%m.%d %H:%M')
+        chunk.to_csv(path, sep=';', index=False, header=start == 0, mode='w' if start == 0 else 'a')
+    return path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic OHLCV file in the format of the Kaggle XAU/USD datasets.')
+    parser.add_argument('--timeframe', default='1d', choices=list(TIMEFRAMES))
+    parser.add_argument('--rows', type=int, help='Number of bars (default: about 20 years of the time frame)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', required=True, help='CSV file to write')
+    args = parser.parse_args()
+
+    rows = args.rows or TIMEFRAMES[args.timeframe][1]
+    write_kaggle_csv(generate_ohlcv(rows, args.timeframe, args.seed), args.output)
+    print(f"Wrote {rows} {args.timeframe} bars to {args.output}")
@@ -1,23 +1,25 @@
+import sys
 import torch
 import pandas as pd
-from sklearn.preprocessing import MinMaxScaler
-from torch.utils.data import DataLoader, TensorDataset
+from torch.utils.data import TensorDataset
 from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from data.feature_join import load_features
+from data.batching import make_loader
+from data.memmap_dataset import prepare_scaled_arrays, memmap_loaders
+from utils.profiling import profile_phase
 
-def load_and_process_data(filename, batch_size):
-    # ===== Loading, Processing and Normalizing the Dataset =====
-    file_path = (Path(__file__).resolve().parent.parent / 'data' / 'dataset' / filename).as_posix()
-    data = pd.read_csv(file_path)
+# All available features: Open, High, Low, Close, Volume, MA_50, MA_200, EMA_12, EMA_26, EMA_12-26, EMA_50, EMA_200, EMA_50-200, %K, %D, RSI,
+# BB_Middle, BB_Upper, BB_Lower (Bollinger bands), FIB_23.6, FIB_38.2, FIB_50.0, FIB_61.8, FIB_78.6 (Fibonacci retracement levels)
+# Joined features (see feature_join.py): FED_Interest, FED_Unemployment, FED_Inflation and <timeframe>_<column> (e.g. 1d_RSI on 1h bars)
+FEATURES = ['Open', 'High', 'Low', 'Close', 'Volume', 'MA_50', 'MA_200', 'EMA_12-26', 'EMA_50-200', 'EMA_200', 'RSI']
 
-    # All available features: Open, High, Low, Close, Volume, MA_50, MA_200, EMA_12, EMA_26, EMA_12-26, EMA_50, EMA_200, EMA_50-200, %K, %D, RSI
-    features = ['Open', 'High', 'Low', 'Close', 'Volume', 'MA_50', 'MA_200', 'EMA_12-26', 'EMA_50-200', 'EMA_200', 'RSI']
-    target = 'future_close'
-    
+
+# Split the dataset into 70% training, 15% validation, 15% testing and add the target column
+def split_data(data):
     data.dropna(inplace=True)
     data.reset_index(drop=True, inplace=True)
 
-
-    # Split the dataset into 70% training, 15% validation, 15% testing
     train_size = int(len(data) * 0.7)
     val_size = int(len(data) * 0.15)
 
@@ -39,15 +41,45 @@ def load_and_process_data(filename, batch_size):
     training.reset_index(drop=True, inplace=True)
     validation.reset_index(drop=True, inplace=True)
     testing.reset_index(drop=True, inplace=True)
+    return training, validation, testing
+
+
+def load_and_process_data(filename, batch_size, features=None, profiler=None, batch_loader='tensor', shuffle=False, memmap=False, prefetch=4):
+    # ===== Loading, Processing and Normalizing the Dataset =====
+    file_path = (Path(__file__).resolve().parent.parent / 'data' / 'dataset' / filename).as_posix()
+
+    # Columns joined from the FED series or other time frames can be added to the features (see feature_join.py)
+    features = list(features or FEATURES)
+    target = 'future_close'
+
+    # Larger-than-memory mode: the scaled splits are written to disk once and memory-mapped,
+    # and the batches are read a few batches ahead on worker threads (see memmap_dataset.py)
+    if memmap:
+        with profile_phase(profiler, 'scale'):
+            directory, scaler, _ = prepare_scaled_arrays(file_path, features)
+        train_loader, val_loader, test_loader = memmap_loaders(directory, batch_size, 'y', shuffle=shuffle, prefetch=prefetch)
+        return train_loader, val_loader, test_loader, features, target, scaler
+
+    # Read only the feature columns (memory-mapped from the binary store, or from the CSV)
+    with profile_phase(profiler, 'read') as phase:
+        data = load_features(file_path, features)
+        phase['samples'] = len(data)
+    
+    # Split the dataset into 70% training, 15% validation, 15% testing
+    with profile_phase(profiler, 'split'):
+        training, validation, testing = split_data(data)
 
 
     # Normalize using MinMaxScaler
-    scaler = MinMaxScaler()
-    scaler.fit(training[features])
+    # (sklearn is imported here, so importing this module stays fast)
+    with profile_phase(profiler, 'scale'):
+        from sklearn.preprocessing import MinMaxScaler
+        scaler = MinMaxScaler()
+        scaler.fit(training[features])
 
-    train_data = scaler.transform(training[features])
-    val_data = scaler.transform(validation[features])
-    test_data = scaler.transform(testing[features])
+        train_data = scaler.transform(training[features])
+        val_data = scaler.transform(validation[features])
+        test_data = scaler.transform(testing[features])
 
     train_target = training[[target]].values
     val_target = validation[[target]].values
@@ -60,14 +92,16 @@ def load_and_process_data(filename, batch_size):
         y = torch.tensor(target, dtype=torch.float32)
         return TensorDataset(x, y)
 
-    train_dataset = create_tensor_dataset(train_data, train_target)
-    val_dataset = create_tensor_dataset(val_data, val_target)
-    test_dataset = create_tensor_dataset(test_data, test_target)
+    with profile_phase(profiler, 'tensors'):
+        train_dataset = create_tensor_dataset(train_data, train_target)
+        val_dataset = create_tensor_dataset(val_data, val_target)
+        test_dataset = create_tensor_dataset(test_data, test_target)
 
 
-    # Create DataLoader for each dataset
-    train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=False)
-    val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False)
-    test_loader = DataLoader(test_dataset, batch_size=batch_size, shuffle=False)
+    # Create the batch loader for each dataset ('tensor': batches sliced from the stored tensors, 'dataloader': torch DataLoader)
+    # shuffle: shuffle the training batches (in blocks of consecutive samples)
+    train_loader = make_loader(train_dataset, batch_size, batch_loader, shuffle)
+    val_loader = make_loader(val_dataset, batch_size, batch_loader)
+    test_loader = make_loader(test_dataset, batch_size, batch_loader)
     
-    return train_loader, val_loader, test_loader, features, target
\ No newline at end of file
+    return train_loader, val_loader, test_loader, features, target, scaler
\ No newline at end of file
@@ -1,24 +1,62 @@
+import sys
 import torch
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import MinMaxScaler
-from torch.utils.data import DataLoader, TensorDataset
+from torch.utils.data import Dataset
 from pathlib import Path
-
-def load_and_process_data(filename, seq_len, pred_len, batch_size):
-    # ===== Loading, Processing and Normalizing the Dataset =====
-    file_path = (Path(__file__).resolve().parent.parent / 'data' / 'dataset' / filename).as_posix()
-    data = pd.read_csv(file_path)
-
-    # All available features: Open, High, Low, Close, Volume, MA_50, MA_200, EMA_12, EMA_26, EMA_12-26, EMA_50, EMA_200, EMA_50-200, %K, %D, RSI
-    features = ['Open', 'High', 'Low', 'Close', 'Volume', 'MA_50', 'MA_200', 'EMA_12-26', 'EMA_50-200', 'EMA_200', 'RSI']
-    target = ['future_close']   
-
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from data.feature_join import load_features
+from data.batching import make_loader
+from data.memmap_dataset import prepare_scaled_arrays, memmap_loaders
+from utils.profiling import profile_phase
+
+# All available features: Open, High, Low, Close, Volume, MA_50, MA_200, EMA_12, EMA_26, EMA_12-26, EMA_50, EMA_200, EMA_50-200, %K, %D, RSI,
+# BB_Middle, BB_Upper, BB_Lower (Bollinger bands), FIB_23.6, FIB_38.2, FIB_50.0, FIB_61.8, FIB_78.6 (Fibonacci retracement levels)
+# Joined features (see feature_join.py): FED_Interest, FED_Unemployment, FED_Inflation and <timeframe>_<column> (e.g. 1d_RSI on 1h bars)
+FEATURES = ['Open', 'High', 'Low', 'Close', 'Volume', 'MA_50', 'MA_200', 'EMA_12-26', 'EMA_50-200', 'EMA_200', 'RSI']
+
+
+# ===== Sliding Window Dataset =====
+# Stores the scaled features and targets once and returns each window as a strided view,
+# so memory stays linear in the number of rows instead of rows x seq_len
+class SlidingWindowDataset(Dataset):
+    def __init__(self, data, target, seq_len, pred_len):
+        self.data = torch.as_tensor(data, dtype=torch.float32)
+        self.target = torch.as_tensor(target, dtype=torch.float32)
+        self.seq_len = seq_len
+        self.pred_len = pred_len
+        self.num_windows = max(len(self.data) - seq_len - pred_len + 1, 0)
+
+        # (num_windows, seq_len, num_features) and (num_windows, pred_len, 1) views, no copy
+        if self.num_windows > 0:
+            self.sequences = self.data.unfold(0, seq_len, 1).transpose(1, 2)[:self.num_windows]
+            self.targets = self.target[seq_len:].unfold(0, pred_len, 1).transpose(1, 2)[:self.num_windows]
+        else:
+            self.sequences = self.data.new_empty((0, seq_len, self.data.shape[1]))
+            self.targets = self.target.new_empty((0, pred_len, self.target.shape[1]))
+
+    def __len__(self):
+        return self.num_windows
+
+    def __getitem__(self, idx):
+        return self.sequences[idx], self.targets[idx]
+
+
+# Sliding windows to create sequences (zero-copy views over the input arrays)
+def create_sequences(data, target, seq_len, pred_len):
+    num_windows = max(len(data) - seq_len - pred_len + 1, 0)
+    if num_windows == 0:
+        return np.empty((0, seq_len, data.shape[1]), dtype=data.dtype), np.empty((0, pred_len, target.shape[1]), dtype=target.dtype)
+    sequences = np.lib.stride_tricks.sliding_window_view(data, seq_len, axis=0).swapaxes(1, 2)[:num_windows]
+    targets = np.lib.stride_tricks.sliding_window_view(target[seq_len:], pred_len, axis=0).swapaxes(1, 2)[:num_windows]
+    return sequences, targets
+
+
+# Split the dataset into 70% training, 15% validation, 15% testing and add the target column
+def split_data(data):
     data.dropna(inplace=True)
     data.reset_index(drop=True, inplace=True)
 
-
-    # Split the dataset into 70% training, 15% validation, 15% testing
     train_size = int(len(data) * 0.7)
     val_size = int(len(data) * 0.15)
 
@@ -40,54 +78,65 @@ def load_and_process_data(filename, seq_len, pred_len, batch_size):
     training.reset_index(drop=True, inplace=True)
     validation.reset_index(drop=True, inplace=True)
     testing.reset_index(drop=True, inplace=True)
+    return training, validation, testing
+
+
+def load_and_process_data(filename, seq_len, pred_len, batch_size, features=None, profiler=None, batch_loader='tensor', shuffle=False, memmap=False, prefetch=4):
+    # ===== Loading, Processing and Normalizing the Dataset =====
+    file_path = (Path(__file__).resolve().parent.parent / 'data' / 'dataset' / filename).as_posix()
+
+    # Columns joined from the FED series or other time frames can be added to the features (see feature_join.py)
+    features = list(features or FEATURES)
+    target = ['future_close']
+
+    # Larger-than-memory mode: the scaled splits are written to disk once and memory-mapped, and the windows of each batch
+    # are built when it is needed, a few batches ahead on worker threads (see memmap_dataset.py)
+    if memmap:
+        with profile_phase(profiler, 'scale'):
+            directory, features_scaler, target_scaler = prepare_scaled_arrays(file_path, features)
+        train_loader, val_loader, test_loader = memmap_loaders(directory, batch_size, 'y_scaled', seq_len, pred_len, shuffle, prefetch)
+        return train_loader, val_loader, test_loader, features, pred_len, features_scaler, target_scaler
+
+    # Read only the feature columns (memory-mapped from the binary store, or from the CSV)
+    with profile_phase(profiler, 'read') as phase:
+        data = load_features(file_path, features)
+        phase['samples'] = len(data)
+
+    # Split the dataset into 70% training, 15% validation, 15% testing
+    with profile_phase(profiler, 'split'):
+        training, validation, testing = split_data(data)
 
 
     # Normalize the features using MinMaxScaler
-    features_scaler = MinMaxScaler()
-    features_scaler.fit(training[features])
-
-    train_data = features_scaler.transform(training[features])
-    val_data = features_scaler.transform(validation[features])
-    test_data = features_scaler.transform(testing[features])
-
-    target_scaler = MinMaxScaler()
-    target_scaler.fit(training[target])
-
-    train_target = target_scaler.transform(training[target])
-    val_target = target_scaler.transform(validation[target])
-    test_target = target_scaler.transform(testing[target])
-
-
-    # Sliding windows to create sequences
-    def create_sequences(data, target, seq_len, pred_len):
-        sequences = []
-        targets = []
-        for i in range(len(data) - seq_len - pred_len + 1):
-            seq = data[i:i + seq_len]
-            label = target[i + seq_len:i + seq_len + pred_len]
-            sequences.append(seq)
-            targets.append(label)
-        return np.array(sequences), np.array(targets)
-    
-    train_data, train_target = create_sequences(train_data, train_target, seq_len, pred_len)
-    val_data, val_target = create_sequences(val_data, val_target, seq_len, pred_len)
-    test_data, test_target = create_sequences(test_data, test_target, seq_len, pred_len)
-
-
-    # Create TensorDataset
-    def create_tensor_dataset(data, target):
-        x = torch.tensor(data, dtype=torch.float32)
-        y = torch.tensor(target, dtype=torch.float32)
-        return TensorDataset(x, y)
-
-    train_dataset = create_tensor_dataset(train_data, train_target)
-    val_dataset = create_tensor_dataset(val_data, val_target)
-    test_dataset = create_tensor_dataset(test_data, test_target)
-
-
-    # Create DataLoader for each dataset
-    train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=False)
-    val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False)
-    test_loader = DataLoader(test_dataset, batch_size=batch_size, shuffle=False)
+    # (sklearn is imported here, so importing this module stays fast)
+    with profile_phase(profiler, 'scale'):
+        from sklearn.preprocessing import MinMaxScaler
+        features_scaler = MinMaxScaler()
+        features_scaler.fit(training[features])
+
+        train_data = features_scaler.transform(training[features])
+        val_data = features_scaler.transform(validation[features])
+        test_data = features_scaler.transform(testing[features])
+
+        target_scaler = MinMaxScaler()
+        target_scaler.fit(training[target])
+
+        train_target = target_scaler.transform(training[target])
+        val_target = target_scaler.transform(validation[target])
+        test_target = target_scaler.transform(testing[target])
+
+
+    # Create the sliding window datasets (windows are built lazily as views)
+    with profile_phase(profiler, 'sequences'):
+        train_dataset = SlidingWindowDataset(train_data, train_target, seq_len, pred_len)
+        val_dataset = SlidingWindowDataset(val_data, val_target, seq_len, pred_len)
+        test_dataset = SlidingWindowDataset(test_data, test_target, seq_len, pred_len)
+
+
+    # Create the batch loader for each dataset ('tensor': batches sliced from the stored tensors, 'dataloader': torch DataLoader)
+    # shuffle: shuffle the training batches (in blocks of consecutive samples)
+    train_loader = make_loader(train_dataset, batch_size, batch_loader, shuffle)
+    val_loader = make_loader(val_dataset, batch_size, batch_loader)
+    test_loader = make_loader(test_dataset, batch_size, batch_loader)
 
     return train_loader, val_loader, test_loader, features, pred_len, features_scaler, target_scaler
\ No newline at end of file
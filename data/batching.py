@@ -0,0 +1,54 @@
+import torch
+from torch.utils.data import DataLoader
+
+
+# ===== Tensor Batch Loader =====
+# Drop-in replacement for DataLoader over in-memory tensors: every batch is sliced at once from the stored tensors
+# instead of being collated sample by sample, so the per-step overhead does not grow with the batch size.
+# Works on a TensorDataset (its tensors) or a SlidingWindowDataset (its window views), and yields the same (x, y) batches.
+#   shuffle: visit the samples in blocks of block_size consecutive samples, in a new random block order every epoch
+#            (with block_size equal to batch_size, the default, each batch is still a single slice)
+class TensorBatchLoader:
+    def __init__(self, dataset, batch_size, shuffle=False, block_size=None, generator=None):
+        self.dataset = dataset
+        self.tensors = dataset.tensors if hasattr(dataset, 'tensors') else (dataset.sequences, dataset.targets)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.block_size = block_size or batch_size
+        self.generator = generator
+        self.num_samples = len(dataset)
+
+    def __len__(self):
+        return (self.num_samples + self.batch_size - 1) // self.batch_size
+
+    def _slice(self, start, stop):
+        return tuple(tensor[start:stop].contiguous() for tensor in self.tensors)
+
+    def __iter__(self):
+        if not self.shuffle:
+            for start in range(0, self.num_samples, self.batch_size):
+                yield self._slice(start, start + self.batch_size)
+            return
+
+        num_blocks = (self.num_samples + self.block_size - 1) // self.block_size
+        blocks = torch.randperm(num_blocks, generator=self.generator)
+        if self.block_size == self.batch_size:
+            for block in blocks.tolist():
+                yield self._slice(block * self.block_size, (block + 1) * self.block_size)
+            return
+
+        # Indices of the samples in block order, then one gather per tensor and batch
+        order = (blocks[:, None] * self.block_size + torch.arange(self.block_size)).flatten()
+        order = order[order < self.num_samples]
+        for start in range(0, self.num_samples, self.batch_size):
+            index = order[start:start + self.batch_size]
+            yield tuple(tensor[index] for tensor in self.tensors)
+
+
+# Loader of the data modules: 'tensor' for the TensorBatchLoader, 'dataloader' for the torch DataLoader
+def make_loader(dataset, batch_size, batch_loader='tensor', shuffle=False, block_size=None):
+    if batch_loader == 'tensor':
+        return TensorBatchLoader(dataset, batch_size, shuffle=shuffle, block_size=block_size)
+    if batch_loader == 'dataloader':
+        return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle)
+    raise ValueError(f"Unknown batch loader '{batch_loader}', use 'tensor' or 'dataloader'")
@@ -1,34 +1,69 @@
+import io
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
 import pandas as pd
 from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from data.indicator_engine import IndicatorEngine, LOOKBACK, INDICATOR_COLUMNS, BOLLINGER_WINDOW, BOLLINGER_STD, FIBONACCI_WINDOW, FIBONACCI_LEVELS
+from data.indicator_kernel import compute_indicators
+from data.prepared_store import CSV_DATE_FORMAT, PreparedStoreWriter, save_prepared, is_store_fresh
 
 dataset_dir = Path(__file__).parent / 'dataset'
-files = list(dataset_dir.glob('*.csv'))
+date_format = '%Y.%m.%d %H:%M'    # Date format of the downloaded files
 
-# ===== Data Cleaning =====
-for file in files:
-    # Load the data from the CSV file
-    df = pd.read_csv(file)
 
+# ===== Data Cleaning =====
+def clean_data(df):
     # Divide the single column into 6 columns by splitting on ';'
     if len(df.columns) == 1:
         columns = df.columns[0].split(';')
         df = df[df.columns[0]].str.split(';', expand=True)
         df.columns = columns
 
-    # Drop useless Date column
-    if 'Date' in df.columns:
-        df.drop(columns=['Date'], inplace=True)
-
     # Drop the rows with missing values (some indicators require a certain number of previous values)
-    df_clean = df.dropna()
+    df = df.dropna()
+
+    # Convert the split columns to numbers, and keep the Date to align other series with the bars (see feature_join.py)
+    numeric = [column for column in df.columns if column != 'Date']
+    df[numeric] = df[numeric].apply(pd.to_numeric)
+    if 'Date' in df.columns and df['Date'].dtype.kind != 'M':
+        df['Date'] = parse_dates(df['Date'])
+    return df
 
-    # Save the cleaned data to a new CSV file
-    df_clean.to_csv(file, index=False)
+
+# Dates of a downloaded file, or of a file that has already been prepared
+def parse_dates(dates):
+    try:
+        return pd.to_datetime(dates, format=date_format)
+    except ValueError:
+        return pd.to_datetime(dates, format=CSV_DATE_FORMAT)
 
 
 # ===== Adding financial indicators to the dataset ====
-    # Load the data from the CSV file
-    data = pd.read_csv(file)
+# EMA with adjust=False, optionally continuing from the EMA value of the row before the first one
+def ema(close, span, seed=None):
+    if seed is None:
+        return close.ewm(span=span, adjust=False).mean()
+    values = np.concatenate(([seed], close.to_numpy(dtype=float)))
+    return pd.Series(values).ewm(span=span, adjust=False).mean().iloc[1:].set_axis(close.index)
+
+
+# ema_seeds: {span: EMA value} of the row before the first one, when data continues a previous chunk
+def add_indicators(data, ema_seeds=None):
+    block = compute_indicators(data['Close'], data['High'], data['Low'], ema_seeds)
+    # The block becomes the indicator columns without a copy (they are recomputed if the data was already prepared)
+    indicators = pd.DataFrame(block.T, columns=INDICATOR_COLUMNS, index=data.index, copy=False)
+    data = data.drop(columns=[column for column in INDICATOR_COLUMNS if column in data.columns])
+    return pd.concat([data, indicators], axis=1)
+
+
+# Reference definitions of the indicators, one pandas operation at a time: add_indicators gives the same numbers
+def add_indicators_pandas(data, ema_seeds=None):
+    ema_seeds = ema_seeds or {}
 
     # CALCULATE FINANCIAL INDICATORS
     # MA: Moving Average
@@ -37,12 +72,12 @@ for file in files:
 
     # EMA: Exponential Moving Average
     # EMA_12-26: 12-day EMA - 26-day EMA
-    data['EMA_12'] = data['Close'].ewm(span=12, adjust=False).mean()
-    data['EMA_26'] = data['Close'].ewm(span=26, adjust=False).mean()
+    data['EMA_12'] = ema(data['Close'], 12, ema_seeds.get(12))
+    data['EMA_26'] = ema(data['Close'], 26, ema_seeds.get(26))
     data['EMA_12-26'] = data['EMA_12'] - data['EMA_26']
     # EMA 50-200
-    data['EMA_50'] = data['Close'].ewm(span=50, adjust=False).mean()
-    data['EMA_200'] = data['Close'].ewm(span=200, adjust=False).mean()
+    data['EMA_50'] = ema(data['Close'], 50, ema_seeds.get(50))
+    data['EMA_200'] = ema(data['Close'], 200, ema_seeds.get(200))
     data['EMA_50-200'] = data['EMA_50'] - data['EMA_200']
 
     # SO: Stochastic Oscillator
@@ -51,7 +86,7 @@ for file in files:
     k_line = 100 * ((data['Close'] - lowest_low) / (highest_high - lowest_low))
     d_line = k_line.rolling(window=3).mean()
     data['%K'] = k_line
-    data['%D'] = d_line   
+    data['%D'] = d_line
     # TODO: Change the Stochastic Oscillator in 1 unique value
 
     # RSI: Relative Strength Index
@@ -63,11 +98,182 @@ for file in files:
     rs = avg_gain / avg_loss
     data['RSI'] = 100 - (100 / (1 + rs))
 
-    # Save the data with the financial indicators to a new CSV file without rows with missing values
-    data = data.dropna()
-    data.to_csv(file, index=False)
+    # Bollinger bands: MA_20 +/- 2 standard deviations
+    middle = data['Close'].rolling(window=BOLLINGER_WINDOW).mean()
+    std = data['Close'].rolling(window=BOLLINGER_WINDOW).std()
+    data['BB_Middle'] = middle
+    data['BB_Upper'] = middle + BOLLINGER_STD * std
+    data['BB_Lower'] = middle - BOLLINGER_STD * std
+
+    # Fibonacci retracement levels of the last swing (highest High to lowest Low)
+    swing_high = data['High'].rolling(window=FIBONACCI_WINDOW).max()
+    swing_low = data['Low'].rolling(window=FIBONACCI_WINDOW).min()
+    for column, ratio in FIBONACCI_LEVELS.items():
+        data[column] = swing_high - ratio * (swing_high - swing_low)
+
+    return data
+
+
+def prepare_file(file):
+    # Load the data from the CSV file
+    df = pd.read_csv(file)
+
+    # Clean the data (numeric columns and parsed Date)
+    data = clean_data(df).reset_index(drop=True)
+    data = add_indicators(data).dropna()
+
+    # Save the data with the financial indicators to the CSV file and to the binary store
+    data.to_csv(file, index=False, date_format=CSV_DATE_FORMAT)
+    save_prepared(data, file)
+
+    print(f"Cleaned data and added Financial indicators to {file} file.")
+
+
+# ===== Streaming preparation for the intraday timeframes =====
+# Parses the file in chunks with numeric dtypes, carrying the last LOOKBACK rows and the EMA values
+# across chunk boundaries, and writes the output incrementally, so memory does not grow with the file
+def prepare_file_streaming(file, chunksize):
+    file = Path(file)
+    with open(file) as f:
+        header = f.readline().strip()
+    sep = ';' if ';' in header else ','
+    columns = header.split(sep)
+    dtypes = {column: 'str' if column == 'Date' else 'float64' for column in columns}
+    reader = pd.read_csv(file, sep=sep, usecols=columns, dtype=dtypes, chunksize=chunksize)
+
+    part_file = file.with_name(file.name + '.part')
+    writer = PreparedStoreWriter(file)
+    tail = None
+    ema_seeds = None
+    first_chunk = True
+    completed = False
+    try:
+        for chunk in reader:
+            # Data Cleaning
+            chunk = clean_data(chunk[columns])
+            data = chunk if tail is None else pd.concat([tail, chunk])
+            data = add_indicators(data.reset_index(drop=True), ema_seeds)
+
+            # Keep only the rows of this chunk and append them to the output
+            new_rows = data.iloc[0 if tail is None else len(tail):].dropna()
+            new_rows.to_csv(part_file, mode='w' if first_chunk else 'a', header=first_chunk, index=False, date_format=CSV_DATE_FORMAT)
+            writer.append(new_rows)
+            first_chunk = False
+
+            # Carry the look-back state to the next chunk
+            if len(data) > LOOKBACK:
+                ema_seeds = {span: data[f'EMA_{span}'].iloc[-LOOKBACK - 1] for span in (12, 26, 50, 200)}
+            tail = data[columns].iloc[-LOOKBACK:]
+
+        # Header-only file: there is no output to replace it with, so it is left as it is
+        if first_chunk:
+            print(f"No rows to prepare in {file} file.")
+            return
+        os.replace(part_file, file)
+        completed = True
+    finally:
+        # The manifest is only written for a complete run: after a failure the store stays stale and is rebuilt from the CSV
+        if completed:
+            writer.close()
+        else:
+            part_file.unlink(missing_ok=True)
 
     print(f"Cleaned data and added Financial indicators to {file} file.")
 
-#TODO: Add Fibonacci retracement levels
-#TODO: Add Bollinger bands retracement levels
\ No newline at end of file
+
+# ===== Appending new bars to a prepared dataset =====
+# Read only the header and the last rows of a CSV file
+def read_csv_tail(file, num_rows):
+    with open(file, 'rb') as f:
+        header = f.readline()
+        f.seek(0, 2)
+        pos = f.tell()
+        chunk = b''
+        while pos > len(header) and chunk.count(b'\n') <= num_rows:
+            step = min(1 << 16, pos - len(header))
+            pos -= step
+            f.seek(pos)
+            chunk = f.read(step) + chunk
+    lines = chunk.splitlines()[-num_rows:]
+    return pd.read_csv(io.BytesIO(header + b'\n'.join(lines) + b'\n'))
+
+
+# Extend a prepared file with new raw bars, computing the indicators only for the new rows
+def update_prepared_file(file, new_bars):
+    tail = read_csv_tail(file, LOOKBACK + 1)
+    engine = IndicatorEngine.from_prepared(tail)
+    store_fresh = is_store_fresh(file)
+
+    new_data = clean_data(new_bars)
+    new_data = engine.extend(new_data).dropna()[tail.columns]
+    new_data.to_csv(file, mode='a', header=False, index=False, date_format=CSV_DATE_FORMAT)
+
+    # Keep the binary store in sync (a stale store is rebuilt from the CSV on the next load)
+    if store_fresh:
+        writer = PreparedStoreWriter(file, append=True)
+        writer.append(new_data)
+        writer.close()
+
+    print(f"Appended {len(new_data)} rows with Financial indicators to {file} file.")
+
+
+# ===== Preparing all the files =====
+def prepare_file_timed(file, chunksize=None):
+    start = time.perf_counter()
+    if chunksize:
+        prepare_file_streaming(file, chunksize)
+    else:
+        prepare_file(file)
+    return time.perf_counter() - start
+
+
+# Prepare every file independently (in a process pool if workers > 1): a failing file does not stop the others
+def prepare_all(files, workers=1, chunksize=None):
+    # Start from the biggest files, so that they do not end up running alone at the end
+    files = sorted(files, key=lambda file: file.stat().st_size, reverse=True)
+    failed = []
+    start = time.perf_counter()
+
+    def report(done, file, elapsed=None, error=None):
+        if error is None:
+            print(f"[{done}/{len(files)}] {file.name} prepared in {elapsed:.2f}s")
+        else:
+            failed.append(file)
+            print(f"[{done}/{len(files)}] {file.name} FAILED: {error!r}")
+
+    if workers <= 1:
+        for done, file in enumerate(files, 1):
+            try:
+                report(done, file, prepare_file_timed(file, chunksize))
+            except Exception as e:
+                report(done, file, error=e)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(prepare_file_timed, file, chunksize): file for file in files}
+            for done, future in enumerate(as_completed(futures), 1):
+                try:
+                    report(done, futures[future], future.result())
+                except Exception as e:
+                    report(done, futures[future], error=e)
+
+    print(f"Prepared {len(files) - len(failed)}/{len(files)} files in {time.perf_counter() - start:.2f}s.")
+    return failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Clean the datasets and add the financial indicators.')
+    parser.add_argument('--append', metavar='NEW_BARS', help='CSV file with new raw bars to append to an already prepared dataset')
+    parser.add_argument('--file', help="Name of the prepared dataset to extend (e.g. 'XAU_1h_data.csv')")
+    parser.add_argument('--chunksize', type=int, help='Prepare the files in chunks of this many rows (for the 1m/5m time frames)')
+    parser.add_argument('--workers', type=int, default=1, help='Number of files prepared in parallel (default: 1)')
+    args = parser.parse_args()
+
+    if args.append:
+        if args.file is None:
+            parser.error('--append requires --file')
+        update_prepared_file(dataset_dir / args.file, pd.read_csv(args.append))
+    else:
+        files = list(dataset_dir.glob('*.csv'))
+        failed = prepare_all(files, args.workers, args.chunksize)
+        if failed:
+            sys.exit(1)
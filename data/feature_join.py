@@ -0,0 +1,137 @@
+import re
+import sys
+import argparse
+import pandas as pd
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from data.prepared_store import PreparedStoreWriter, load_prepared, open_columns, read_manifest, is_store_fresh
+
+dataset_dir = Path(__file__).parent / 'dataset'
+fed_path = Path(__file__).parent / 'fed_stats' / 'FED_1Month_interest,unemployment,inflation.csv'
+
+# Joined columns are named after their source:
+#   FED_Interest, FED_Unemployment, FED_Inflation: monthly FED series
+#   <timeframe>_<column>, e.g. 1d_RSI or 4h_EMA_12-26: column of the prepared XAU_<timeframe>_data.csv file
+FED_COLUMNS = ['Interest', 'Unemployment', 'Inflation']
+JOINED_COLUMN = re.compile(r'^(FED|\d+(?:m|h|d|w|Month))_(.+)$')
+
+# The FED value of a month is only known once the month is over and the figures are released
+FED_RELEASE_DELAY = pd.Timedelta(days=15)
+
+
+def is_joined_column(column):
+    return JOINED_COLUMN.match(column) is not None
+
+
+# Derived store with the joined columns of a prepared file (dataset/.store/<name>.joined/)
+def joined_file(file):
+    file = Path(file)
+    return file.with_name(file.stem + '.joined.csv')
+
+
+# ===== Sources =====
+# Each source is a series of values with the time they become available: a bar can only use values available
+# at its opening time, so nothing from the future leaks into the features
+def load_fed(path=fed_path):
+    fed = pd.read_csv(path).dropna()
+    if 'Year' in fed.columns:
+        month = pd.to_datetime(dict(year=fed['Year'], month=fed['Month'], day=1))
+    else:
+        month = pd.to_datetime(fed['Date'], format='%Y.%m.%d')
+    available = (month.dt.to_period('M') + 1).dt.to_timestamp() + FED_RELEASE_DELAY
+    return pd.DataFrame({'available': available, **{f'FED_{column}': fed[column].to_numpy(dtype=float) for column in FED_COLUMNS}})
+
+
+# A bar of a higher timeframe is complete (and its indicators known) one period after its opening time
+def load_higher_timeframe(timeframe, columns):
+    file = dataset_dir / f'XAU_{timeframe}_data.csv'
+    data = load_prepared(file, ['Date'] + columns).dropna()
+    period = data['Date'].diff().mode().iloc[0]
+    return pd.DataFrame({'available': data['Date'] + period, **{f'{timeframe}_{column}': data[column].to_numpy() for column in columns}})
+
+
+def source_file(source):
+    return fed_path if source == 'FED' else dataset_dir / f'XAU_{source}_data.csv'
+
+
+# ===== As-of Join =====
+# For every bar, the last value of each source available at its opening time (one vectorized merge per source)
+def join_features(file, columns):
+    try:
+        dates = load_prepared(file, ['Date'])['Date']
+    except KeyError:
+        raise ValueError(f"{file} has no Date column: prepare it again from the downloaded file with data_preparation.py")
+
+    by_source = {}
+    for column in columns:
+        source, name = JOINED_COLUMN.match(column).groups()
+        by_source.setdefault(source, []).append(name)
+
+    bars = pd.DataFrame({'Date': dates.astype('datetime64[ns]')})
+    joined = pd.DataFrame(index=bars.index)
+    for source, names in by_source.items():
+        values = load_fed() if source == 'FED' else load_higher_timeframe(source, names)
+        values['available'] = values['available'].astype('datetime64[ns]')
+        merged = pd.merge_asof(bars, values.sort_values('available'), left_on='Date', right_on='available', direction='backward')
+        for name in names:
+            joined[f'{source}_{name}'] = merged[f'{source}_{name}'].to_numpy()
+    return joined[columns], [source_file(source) for source in by_source]
+
+
+# ===== Cache =====
+# Joined columns aligned row by row with the prepared file, computed once and memory-mapped afterwards.
+# The cache is rebuilt (keeping the columns it already had) when a column is missing or a source file has changed.
+# Returns the newly joined columns, or None when they were already cached.
+def update_joined(file, columns):
+    cache = joined_file(file)
+    manifest = read_manifest(cache)
+    cached = []
+    if manifest is not None and is_store_fresh(cache, list(manifest['source'])):
+        cached = [column['name'] for column in manifest['columns']]
+    if all(column in cached for column in columns):
+        return None
+
+    joined, sources = join_features(file, list(dict.fromkeys(cached + columns)))
+    writer = PreparedStoreWriter(cache, sources=[file] + sources)
+    writer.append(joined)
+    writer.close()
+    return joined[columns]
+
+
+def load_joined(file, columns):
+    joined = update_joined(file, columns)
+    return pd.DataFrame(open_columns(joined_file(file), columns)) if joined is None else joined
+
+
+# Prepared columns and joined columns of a file, in the requested order
+def load_features(file, columns):
+    extra = [column for column in columns if is_joined_column(column)]
+    data = load_prepared(file, [column for column in columns if column not in extra])
+    if not extra:
+        return data
+    return pd.concat([data.reset_index(drop=True), load_joined(file, extra)], axis=1)[columns]
+
+
+# Same columns as memory-mapped arrays, without loading them (the stores are built first if needed)
+def open_features(file, columns):
+    extra = [column for column in columns if is_joined_column(column)]
+    if not is_store_fresh(file):
+        load_prepared(file, [])
+    arrays = open_columns(file, [column for column in columns if column not in extra])
+    if extra:
+        update_joined(file, extra)
+        arrays.update(open_columns(joined_file(file), extra))
+    return {column: arrays[column] for column in columns}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Join the FED series and higher time frame columns onto a prepared dataset and cache them.')
+    parser.add_argument('--file', required=True, help="Prepared dataset (e.g. 'XAU_1h_data.csv')")
+    parser.add_argument('--columns', nargs='+', required=True, help="Columns to join, e.g. FED_Interest 1d_RSI 1d_EMA_50-200")
+    args = parser.parse_args()
+
+    invalid = [column for column in args.columns if not is_joined_column(column)]
+    if invalid:
+        parser.error(f"Not joinable columns: {invalid} (use FED_<column> or <timeframe>_<column>)")
+    joined = load_joined(dataset_dir / args.file, args.columns)
+    print(f"Joined {', '.join(args.columns)} onto {args.file} ({joined.notna().all(axis=1).sum()}/{len(joined)} rows with all the values).")
@@ -0,0 +1,269 @@
+import math
+from collections import deque
+import numpy as np
+import pandas as pd
+
+# Bollinger bands: MA_20 +/- 2 standard deviations (ddof=1) of the Close
+BOLLINGER_WINDOW = 20
+BOLLINGER_STD = 2
+# Fibonacci retracement levels between the highest High and the lowest Low of the last 100 bars, measured down from the high
+FIBONACCI_WINDOW = 100
+FIBONACCI_LEVELS = {'FIB_23.6': 0.236, 'FIB_38.2': 0.382, 'FIB_50.0': 0.5, 'FIB_61.8': 0.618, 'FIB_78.6': 0.786}
+
+# Indicator columns added by data_preparation.py, in the order they are written
+INDICATOR_COLUMNS = ['MA_50', 'MA_200', 'EMA_12', 'EMA_26', 'EMA_12-26', 'EMA_50', 'EMA_200', 'EMA_50-200', '%K', '%D', 'RSI',
+                     'BB_Middle', 'BB_Upper', 'BB_Lower'] + list(FIBONACCI_LEVELS)
+
+# Number of previous rows needed to rebuild the rolling state (MA_200 is the longest window)
+LOOKBACK = 200
+
+
+# ===== Rolling state =====
+# Window sum with compensated add/remove, same update rules as pandas rolling().mean()
+class RollingMean:
+    def __init__(self, window, min_periods=None):
+        self.window = window
+        self.min_periods = window if min_periods is None else min_periods
+        self.values = deque()
+        self.nobs = 0
+        self.sum = 0.0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.neg_ct = 0
+        self.num_consecutive_same_value = 0
+        self.prev_value = math.nan
+
+    def _add(self, val):
+        if math.isnan(val):
+            return
+        self.nobs += 1
+        y = val - self.compensation_add
+        t = self.sum + y
+        self.compensation_add = t - self.sum - y
+        self.sum = t
+        if math.copysign(1.0, val) < 0:
+            self.neg_ct += 1
+        if val == self.prev_value:
+            self.num_consecutive_same_value += 1
+        else:
+            self.num_consecutive_same_value = 1
+        self.prev_value = val
+
+    def _remove(self, val):
+        if math.isnan(val):
+            return
+        self.nobs -= 1
+        y = -val - self.compensation_remove
+        t = self.sum + y
+        self.compensation_remove = t - self.sum - y
+        self.sum = t
+        if math.copysign(1.0, val) < 0:
+            self.neg_ct -= 1
+
+    def update(self, val):
+        self.values.append(val)
+        if len(self.values) > self.window:
+            self._remove(self.values.popleft())
+        self._add(val)
+
+        if self.nobs < self.min_periods or self.nobs == 0:
+            return math.nan
+        result = self.sum / self.nobs
+        if self.num_consecutive_same_value >= self.nobs:
+            result = self.prev_value
+        elif self.neg_ct == 0 and result < 0:
+            result = 0.0
+        elif self.neg_ct == self.nobs and result > 0:
+            result = 0.0
+        return result
+
+
+# Rolling min/max with a monotonic deque, same as pandas rolling().min() / .max()
+class RollingExtreme:
+    def __init__(self, window, mode):
+        self.window = window
+        self.is_max = mode == 'max'
+        self.candidates = deque()   # (index, value), monotonic in value
+        self.nan_indices = deque()
+        self.index = 0
+
+    def update(self, val):
+        i = self.index
+        self.index += 1
+        if math.isnan(val):
+            self.nan_indices.append(i)
+        else:
+            while self.candidates and (self.candidates[-1][1] <= val if self.is_max else self.candidates[-1][1] >= val):
+                self.candidates.pop()
+            self.candidates.append((i, val))
+
+        # Drop the values that left the window
+        while self.candidates and self.candidates[0][0] <= i - self.window:
+            self.candidates.popleft()
+        while self.nan_indices and self.nan_indices[0] <= i - self.window:
+            self.nan_indices.popleft()
+
+        nobs = min(self.index, self.window) - len(self.nan_indices)
+        if nobs < self.window:
+            return math.nan
+        return self.candidates[0][1]
+
+
+# Window variance with compensated Welford add/remove, same update rules as pandas rolling().var()
+class RollingVariance:
+    def __init__(self, window, ddof=1):
+        self.window = window
+        self.ddof = ddof
+        self.values = deque()
+        self.nobs = 0
+        self.mean = 0.0
+        self.ssqdm = 0.0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+
+    def _add(self, val):
+        if math.isnan(val):
+            return
+        self.nobs += 1
+        prev_mean = self.mean - self.compensation_add
+        y = val - self.compensation_add
+        t = y - self.mean
+        self.compensation_add = t + self.mean - y
+        self.mean = self.mean + t / self.nobs
+        self.ssqdm += (val - prev_mean) * (val - self.mean)
+
+    def _remove(self, val):
+        if math.isnan(val):
+            return
+        self.nobs -= 1
+        if self.nobs:
+            prev_mean = self.mean - self.compensation_remove
+            y = val - self.compensation_remove
+            t = y - self.mean
+            self.compensation_remove = t + self.mean - y
+            self.mean = self.mean - t / self.nobs
+            self.ssqdm -= (val - prev_mean) * (val - self.mean)
+        else:
+            self.mean = 0.0
+            self.ssqdm = 0.0
+
+    def update(self, val):
+        self.values.append(val)
+        if len(self.values) > self.window:
+            self._remove(self.values.popleft())
+        self._add(val)
+
+        if self.nobs < self.window or self.nobs <= self.ddof:
+            return math.nan
+        return max(self.ssqdm / (self.nobs - self.ddof), 0.0)
+
+
+# Exponential moving average with the same update rule as pandas ewm(span, adjust=False).mean()
+class EMA:
+    def __init__(self, span):
+        self.alpha = 2.0 / (span + 1.0)
+        self.weighted = math.nan
+
+    def update(self, val):
+        if math.isnan(self.weighted):
+            if not math.isnan(val):
+                self.weighted = val
+        elif not math.isnan(val) and self.weighted != val:
+            old_wt = 1.0 - self.alpha
+            self.weighted = (old_wt * self.weighted + self.alpha * val) / (old_wt + self.alpha)
+        return self.weighted
+
+
+def _divide(a, b):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return float(np.float64(a) / np.float64(b))
+
+
+# ===== Incremental Indicator Engine =====
+# Keeps the rolling state of every indicator so that new bars can be appended one at a time
+class IndicatorEngine:
+    def __init__(self):
+        # MA: Moving Average
+        self.ma_50 = RollingMean(50)
+        self.ma_200 = RollingMean(200)
+        # EMA: Exponential Moving Average
+        self.ema_12 = EMA(12)
+        self.ema_26 = EMA(26)
+        self.ema_50 = EMA(50)
+        self.ema_200 = EMA(200)
+        # SO: Stochastic Oscillator
+        self.lowest_low = RollingExtreme(14, 'min')
+        self.highest_high = RollingExtreme(14, 'max')
+        self.d_line = RollingMean(3)
+        # RSI: Relative Strength Index
+        self.prev_close = math.nan
+        self.avg_gain = RollingMean(14, min_periods=1)
+        self.avg_loss = RollingMean(14, min_periods=1)
+        # Bollinger bands
+        self.bb_middle = RollingMean(BOLLINGER_WINDOW)
+        self.bb_variance = RollingVariance(BOLLINGER_WINDOW)
+        # Fibonacci retracement levels
+        self.swing_high = RollingExtreme(FIBONACCI_WINDOW, 'max')
+        self.swing_low = RollingExtreme(FIBONACCI_WINDOW, 'min')
+
+    def update(self, close, high, low):
+        row = {}
+        row['MA_50'] = self.ma_50.update(close)
+        row['MA_200'] = self.ma_200.update(close)
+
+        row['EMA_12'] = self.ema_12.update(close)
+        row['EMA_26'] = self.ema_26.update(close)
+        row['EMA_12-26'] = row['EMA_12'] - row['EMA_26']
+        row['EMA_50'] = self.ema_50.update(close)
+        row['EMA_200'] = self.ema_200.update(close)
+        row['EMA_50-200'] = row['EMA_50'] - row['EMA_200']
+
+        lowest_low = self.lowest_low.update(low)
+        highest_high = self.highest_high.update(high)
+        row['%K'] = 100 * _divide(close - lowest_low, highest_high - lowest_low)
+        row['%D'] = self.d_line.update(row['%K'])
+
+        # The first delta is NaN, which pandas turns into a gain of 0 and a loss of -0
+        delta = close - self.prev_close
+        self.prev_close = close
+        gain = delta if delta > 0 else 0.0
+        loss = -(delta if delta < 0 else 0.0)
+        rs = _divide(self.avg_gain.update(gain), self.avg_loss.update(loss))
+        row['RSI'] = 100 - _divide(100, 1 + rs)
+
+        middle = self.bb_middle.update(close)
+        std = math.sqrt(self.bb_variance.update(close))
+        row['BB_Middle'] = middle
+        row['BB_Upper'] = middle + BOLLINGER_STD * std
+        row['BB_Lower'] = middle - BOLLINGER_STD * std
+
+        swing_high = self.swing_high.update(high)
+        swing_low = self.swing_low.update(low)
+        for column, ratio in FIBONACCI_LEVELS.items():
+            row[column] = swing_high - ratio * (swing_high - swing_low)
+        return row
+
+    # Compute the indicators for new rows (with Close, High and Low columns), in order
+    def extend(self, data):
+        closes = data['Close'].to_numpy(dtype=float)
+        highs = data['High'].to_numpy(dtype=float)
+        lows = data['Low'].to_numpy(dtype=float)
+        rows = [self.update(c, h, l) for c, h, l in zip(closes, highs, lows)]
+        indicators = pd.DataFrame(rows, columns=INDICATOR_COLUMNS, index=data.index)
+        return pd.concat([data, indicators], axis=1)
+
+    # Rebuild the state from the last rows of an already prepared dataset
+    @classmethod
+    def from_prepared(cls, tail):
+        # Only the last LOOKBACK+1 rows matter: extend() runs row by row in Python, so a longer tail only costs time
+        tail = tail.iloc[-(LOOKBACK + 1):]
+        engine = cls()
+        engine.extend(tail[['Close', 'High', 'Low']])
+
+        # The EMAs depend on the whole history, so continue from the saved values instead
+        last = tail.iloc[-1]
+        engine.ema_12.weighted = float(last['EMA_12'])
+        engine.ema_26.weighted = float(last['EMA_26'])
+        engine.ema_50.weighted = float(last['EMA_50'])
+        engine.ema_200.weighted = float(last['EMA_200'])
+        return engine
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+from data.indicator_engine import INDICATOR_COLUMNS, BOLLINGER_WINDOW, BOLLINGER_STD, FIBONACCI_WINDOW, FIBONACCI_LEVELS
+
+# All the indicators of data_preparation.py computed at once from the Close, High and Low arrays and written straight
+# into one (indicator, row) block, which becomes the indicator columns of the DataFrame without another copy.
+# The element-wise steps and the rolling min/max are plain numpy, and the intermediate results shared by several
+# indicators are computed once; the window means, the variance and the EMAs go through the compiled pandas window
+# routines on the bare arrays, since their compensated running sums cannot be vectorized without changing the last bits.
+# The results are identical to the pandas definitions (add_indicators_pandas in data_preparation.py).
+
+
+# ===== Window routines =====
+# Rolling min/max of several windows in one doubling sweep: after k steps each row holds the extreme of its last 2**k
+# rows, and a window is the union of the last 2**k rows and of the 2**k rows ending window - 2**k rows earlier, so all
+# the windows share the first log2(window) passes. A NaN anywhere in the window gives NaN, like pandas with min_periods=window.
+def rolling_extremes(values, windows, mode):
+    reduce = np.maximum if mode == 'max' else np.minimum
+    n = len(values)
+    extreme, buffer = values, np.empty(n)
+    span = 1
+    results = {}
+    for window in sorted(windows):
+        while span * 2 <= min(window, n):
+            reduce(extreme[span:], extreme[:-span], out=buffer[span:])
+            buffer[:span] = extreme[:span]
+            extreme, buffer = buffer, (np.empty(n) if extreme is values else extreme)
+            span *= 2
+        result = np.full(n, np.nan)
+        if n >= window:
+            reduce(extreme[window - 1:], extreme[span - 1:n - window + span], out=result[window - 1:])
+        results[window] = result
+    return results
+
+
+def rolling_mean(values, window, min_periods=None):
+    return pd.Series(values, copy=False).rolling(window, min_periods=min_periods).mean().to_numpy()
+
+
+def rolling_std(values, window):
+    return pd.Series(values, copy=False).rolling(window).std().to_numpy()
+
+
+# EMA with adjust=False, optionally continuing from the EMA value of the row before the first one
+def ema(values, span, seed=None):
+    if seed is None:
+        return pd.Series(values, copy=False).ewm(span=span, adjust=False).mean().to_numpy()
+    return pd.Series(np.concatenate(([seed], values))).ewm(span=span, adjust=False).mean().to_numpy()[1:]
+
+
+# ===== Indicator Kernel =====
+# (len(INDICATOR_COLUMNS), rows) array, one row per indicator column; ema_seeds: {span: EMA value} of the row before the first one
+def compute_indicators(close, high, low, ema_seeds=None):
+    ema_seeds = ema_seeds or {}
+    close = np.asarray(close, dtype=np.float64)
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    block = np.empty((len(INDICATOR_COLUMNS), len(close)))
+    out = dict(zip(INDICATOR_COLUMNS, block))
+
+    # MA: Moving Average
+    out['MA_50'][:] = rolling_mean(close, 50)
+    out['MA_200'][:] = rolling_mean(close, 200)
+
+    # EMA: Exponential Moving Average
+    for span in (12, 26, 50, 200):
+        out[f'EMA_{span}'][:] = ema(close, span, ema_seeds.get(span))
+    np.subtract(out['EMA_12'], out['EMA_26'], out=out['EMA_12-26'])
+    np.subtract(out['EMA_50'], out['EMA_200'], out=out['EMA_50-200'])
+
+    # Rolling highs and lows of the Stochastic Oscillator and of the Fibonacci swing
+    highs = rolling_extremes(high, (14, FIBONACCI_WINDOW), 'max')
+    lows = rolling_extremes(low, (14, FIBONACCI_WINDOW), 'min')
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # SO: Stochastic Oscillator
+        k_line = out['%K']
+        np.subtract(close, lows[14], out=k_line)
+        k_line /= highs[14] - lows[14]
+        k_line *= 100
+        out['%D'][:] = rolling_mean(k_line, 3)
+
+        # RSI: Relative Strength Index (the first delta is NaN: a gain of 0 and a loss of -0, as with pandas where())
+        delta = np.empty_like(close)
+        delta[:1] = np.nan
+        np.subtract(close[1:], close[:-1], out=delta[1:])
+        gain = np.where(delta > 0, delta, 0.0)
+        loss = -np.where(delta < 0, delta, 0.0)
+        rsi = out['RSI']
+        np.divide(rolling_mean(gain, 14, min_periods=1), rolling_mean(loss, 14, min_periods=1), out=rsi)
+        rsi += 1
+        np.divide(100, rsi, out=rsi)
+        np.subtract(100, rsi, out=rsi)
+
+    # Bollinger bands
+    middle = out['BB_Middle']
+    middle[:] = rolling_mean(close, BOLLINGER_WINDOW)
+    width = out['BB_Lower']
+    np.multiply(rolling_std(close, BOLLINGER_WINDOW), BOLLINGER_STD, out=width)
+    np.add(middle, width, out=out['BB_Upper'])
+    np.subtract(middle, width, out=width)
+
+    # Fibonacci retracement levels, measured down from the swing high
+    swing_high = highs[FIBONACCI_WINDOW]
+    swing = swing_high - lows[FIBONACCI_WINDOW]
+    for column, ratio in FIBONACCI_LEVELS.items():
+        np.multiply(swing, ratio, out=out[column])
+        np.subtract(swing_high, out[column], out=out[column])
+
+    return block
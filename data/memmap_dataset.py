@@ -0,0 +1,189 @@
+import sys
+import json
+import shutil
+import numpy as np
+import pandas as pd
+import torch
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from torch.utils.data import Dataset
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from data.prepared_store import read_manifest, store_dir
+from data.feature_join import open_features, joined_file, is_joined_column
+
+# Larger-than-memory mode of the data loaders, for the intraday files (e.g. 1m bars with seq_len=30):
+# the features are scaled chunk by chunk into float32 arrays on disk (dataset/.store/<name>.scaled/), which are memory-mapped,
+# and the batches (or RNN windows) are read from them only when needed, a few batches ahead on worker threads.
+# The splits, the target and the scalers are the same as with split_data and the MinMaxScalers of the data loaders.
+CHUNK_ROWS = 1_000_000
+SPLITS = ['train', 'val', 'test']
+
+
+def scaled_dir(file):
+    file = Path(file)
+    return store_dir(file.with_name(file.stem + '.scaled.csv'))
+
+
+# What the scaled arrays were computed from: the features and the stores they were read from
+def _scaled_key(file, features):
+    stores = [file] + ([joined_file(file)] if any(is_joined_column(column) for column in features) else [])
+    return {'features': features, 'stores': [{key: read_manifest(store)[key] for key in ('rows', 'source')} for store in stores]}
+
+
+# ===== Split =====
+# Rows kept by split_data: the rows without NaN features, split 70/15/15, each split without its last row (no next close).
+# Returns the rows of the features and the rows of their target (next close) for each split.
+def split_rows(columns, chunk_rows=CHUNK_ROWS):
+    num_rows = len(next(iter(columns.values())))
+    valid = np.ones(num_rows, dtype=bool)
+    for start in range(0, num_rows, chunk_rows):
+        for values in columns.values():
+            valid[start:start + chunk_rows] &= ~np.isnan(values[start:start + chunk_rows])
+    rows = np.flatnonzero(valid)
+
+    train_size = int(len(rows) * 0.7)
+    val_size = int(len(rows) * 0.15)
+    bounds = [(0, train_size), (train_size, train_size + val_size), (train_size + val_size, len(rows))]
+    return {split: (rows[a:b - 1], rows[a + 1:b]) for split, (a, b) in zip(SPLITS, bounds) if b > a}
+
+
+def _gather(columns, features, rows):
+    return pd.DataFrame({feature: columns[feature][rows] for feature in features}, dtype=np.float64)
+
+
+# ===== Scaling =====
+# Fits the scalers on the training rows and writes <split>_x.npy (scaled features), <split>_y.npy (next close)
+# and <split>_y_scaled.npy (scaled next close) for each split, reading at most chunk_rows rows at a time.
+# The arrays are reused as long as the features and the prepared store do not change.
+def prepare_scaled_arrays(file, features, chunk_rows=CHUNK_ROWS):
+    from sklearn.preprocessing import MinMaxScaler
+    features = list(features)
+    columns = open_features(file, list(dict.fromkeys(features + ['Close'])))
+    directory = scaled_dir(file)
+    key = _scaled_key(file, features)
+
+    manifest_path = directory / 'manifest.json'
+    if manifest_path.exists():
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest['key'] == key:
+            return directory, _scaler(manifest['features_range'], features), _scaler(manifest['target_range'], ['future_close'])
+
+    splits = split_rows({feature: columns[feature] for feature in features}, chunk_rows)
+    if 'train' not in splits:
+        raise ValueError(f"{file} has no rows without missing features")
+
+    features_scaler = MinMaxScaler()
+    target_scaler = MinMaxScaler()
+    rows, target_rows = splits['train']
+    for start in range(0, len(rows), chunk_rows):
+        features_scaler.partial_fit(_gather(columns, features, rows[start:start + chunk_rows]))
+        target_scaler.partial_fit(_gather(columns, ['Close'], target_rows[start:start + chunk_rows]).set_axis(['future_close'], axis=1))
+
+    # The manifest is written last, so an interrupted run is computed again
+    shutil.rmtree(directory, ignore_errors=True)
+    directory.mkdir(parents=True)
+    for split in SPLITS:
+        rows, target_rows = splits.get(split, (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)))
+        x = np.lib.format.open_memmap(directory / f'{split}_x.npy', mode='w+', dtype=np.float32, shape=(len(rows), len(features)))
+        y = np.lib.format.open_memmap(directory / f'{split}_y.npy', mode='w+', dtype=np.float32, shape=(len(rows), 1))
+        y_scaled = np.lib.format.open_memmap(directory / f'{split}_y_scaled.npy', mode='w+', dtype=np.float32, shape=(len(rows), 1))
+        for start in range(0, len(rows), chunk_rows):
+            stop = start + chunk_rows
+            target = _gather(columns, ['Close'], target_rows[start:stop]).set_axis(['future_close'], axis=1)
+            x[start:stop] = features_scaler.transform(_gather(columns, features, rows[start:stop]))
+            y[start:stop] = target.to_numpy()
+            y_scaled[start:stop] = target_scaler.transform(target)
+        for array in (x, y, y_scaled):
+            array.flush()
+        del x, y, y_scaled
+
+    with open(manifest_path, 'w') as f:
+        json.dump({'key': key, 'features_range': _range(features_scaler), 'target_range': _range(target_scaler)}, f, indent=2)
+    return directory, features_scaler, target_scaler
+
+
+def _range(scaler):
+    return {'min': scaler.data_min_.tolist(), 'max': scaler.data_max_.tolist()}
+
+
+# A MinMaxScaler fitted on the saved minimum and maximum is the same as the one fitted on the training rows
+def _scaler(value_range, columns):
+    from sklearn.preprocessing import MinMaxScaler
+    return MinMaxScaler().fit(pd.DataFrame([value_range['min'], value_range['max']], columns=columns))
+
+
+# ===== Memory-mapped Dataset =====
+# Samples of a memory-mapped split: rows (seq_len=None, for the MLPs) or windows of seq_len rows with the pred_len next targets
+# (like SlidingWindowDataset). batch() reads the rows of consecutive samples at once and builds their windows.
+class MemmapWindowDataset(Dataset):
+    def __init__(self, data_path, target_path, seq_len=None, pred_len=None):
+        self.data = np.load(data_path, mmap_mode='r')
+        self.target = np.load(target_path, mmap_mode='r')
+        self.seq_len = seq_len
+        self.pred_len = pred_len
+        if seq_len is None:
+            self.num_samples = len(self.data)
+        else:
+            self.num_samples = max(len(self.data) - seq_len - pred_len + 1, 0)
+
+    def __len__(self):
+        return self.num_samples
+
+    def batch(self, start, stop):
+        stop = min(stop, self.num_samples)
+        if self.seq_len is None:
+            return torch.from_numpy(np.array(self.data[start:stop])), torch.from_numpy(np.array(self.target[start:stop]))
+
+        data = torch.from_numpy(np.array(self.data[start:stop + self.seq_len - 1]))
+        target = torch.from_numpy(np.array(self.target[start + self.seq_len:stop + self.seq_len + self.pred_len - 1]))
+        sequences = data.unfold(0, self.seq_len, 1).transpose(1, 2).contiguous()
+        targets = target.unfold(0, self.pred_len, 1).transpose(1, 2).contiguous()
+        return sequences, targets
+
+    def __getitem__(self, idx):
+        sequences, targets = self.batch(idx, idx + 1)
+        return sequences[0], targets[0]
+
+
+# ===== Prefetching Loader =====
+# Yields the batches of a MemmapWindowDataset in order (or in a random batch order with shuffle), while `workers` threads
+# already read the next `prefetch` batches from disk, so the training loop does not wait for them
+class PrefetchBatchLoader:
+    def __init__(self, dataset, batch_size, shuffle=False, prefetch=4, workers=2, generator=None):
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.prefetch = prefetch
+        self.workers = workers
+        self.generator = generator
+
+    def __len__(self):
+        return (len(self.dataset) + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        starts = torch.arange(len(self)) * self.batch_size
+        if self.shuffle:
+            starts = starts[torch.randperm(len(starts), generator=self.generator)]
+
+        executor = ThreadPoolExecutor(self.workers)
+        pending = deque()
+        try:
+            for start in starts.tolist():
+                pending.append(executor.submit(self.dataset.batch, start, start + self.batch_size))
+                if len(pending) > self.prefetch:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+
+# Train, validation and test loaders over the scaled arrays; target: 'y' (next close) or 'y_scaled'
+def memmap_loaders(directory, batch_size, target='y', seq_len=None, pred_len=None, shuffle=False, prefetch=4, workers=2):
+    loaders = []
+    for split in SPLITS:
+        dataset = MemmapWindowDataset(directory / f'{split}_x.npy', directory / f'{split}_{target}.npy', seq_len, pred_len)
+        loaders.append(PrefetchBatchLoader(dataset, batch_size, shuffle and split == 'train', prefetch, workers))
+    return loaders
@@ -0,0 +1,130 @@
+import json
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# Prepared datasets are also kept as one raw binary file per column plus a JSON manifest,
+# so that the loaders can memory-map only the columns they need instead of parsing the CSV:
+#   dataset/.store/XAU_1d_data/manifest.json
+#   dataset/.store/XAU_1d_data/0.bin, 1.bin, ...
+
+# Format of the Date column in the prepared CSV files
+CSV_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def store_dir(file):
+    file = Path(file)
+    return file.parent / '.store' / file.stem
+
+
+# Size and modification time of the CSV, used to detect a store that is out of date
+def _csv_signature(file):
+    stat = Path(file).stat()
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+# Signatures of all the files a derived store is computed from
+def _sources_signature(sources):
+    return {Path(source).as_posix(): _csv_signature(source) for source in sources}
+
+
+# ===== Writing =====
+# Writes a frame chunk by chunk, so that large files never need to be in memory at once.
+# sources: files the data is computed from, when it is not the content of `file` itself (e.g. joined features)
+class PreparedStoreWriter:
+    def __init__(self, file, append=False, sources=None):
+        self.file = Path(file)
+        self.sources = sources
+        self.dir = store_dir(file)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.manifest = None
+        if not append:
+            (self.dir / 'manifest.json').unlink(missing_ok=True)
+        else:
+            self.manifest = read_manifest(file)
+            if self.manifest is None:
+                raise FileNotFoundError(f"No prepared store to append to for {self.file}")
+
+    def append(self, data):
+        if self.manifest is None:
+            columns = []
+            for i, name in enumerate(data.columns):
+                dtype = data[name].dtype
+                if dtype.kind not in 'biufM':
+                    raise ValueError(f"Column '{name}' has non-numeric dtype {dtype} and cannot be stored")
+                columns.append({'name': name, 'dtype': str(dtype), 'file': f'{i}.bin'})
+                (self.dir / f'{i}.bin').write_bytes(b'')
+            self.manifest = {'rows': 0, 'columns': columns}
+
+        for column in self.manifest['columns']:
+            values = np.ascontiguousarray(data[column['name']].to_numpy(dtype=column['dtype']))
+            with open(self.dir / column['file'], 'ab') as f:
+                f.write(values.tobytes())
+        self.manifest['rows'] += len(data)
+
+    # The manifest is written last, so a crash leaves a store that is detected as stale
+    def close(self):
+        if self.manifest is None:
+            return
+        self.manifest['source'] = _csv_signature(self.file) if self.sources is None else _sources_signature(self.sources)
+        with open(self.dir / 'manifest.json', 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+
+
+def save_prepared(data, file):
+    writer = PreparedStoreWriter(file)
+    writer.append(data)
+    writer.close()
+
+
+# ===== Reading =====
+def read_manifest(file):
+    manifest_path = store_dir(file) / 'manifest.json'
+    if not manifest_path.exists():
+        return None
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def is_store_fresh(file, sources=None):
+    manifest = read_manifest(file)
+    if manifest is None:
+        return False
+    if sources is not None:
+        return all(Path(source).exists() for source in sources) and manifest.get('source') == _sources_signature(sources)
+    return not Path(file).exists() or manifest.get('source') == _csv_signature(file)
+
+
+# Memory-mapped read-only arrays of the requested columns
+def open_columns(file, columns=None):
+    manifest = read_manifest(file)
+    available = {column['name']: column for column in manifest['columns']}
+    if columns is None:
+        columns = list(available)
+    missing = [name for name in columns if name not in available]
+    if missing:
+        raise KeyError(f"Columns {missing} are not in the prepared store of {file}")
+
+    arrays = {}
+    for name in columns:
+        column = available[name]
+        if manifest['rows'] == 0:
+            arrays[name] = np.empty(0, dtype=column['dtype'])
+        else:
+            arrays[name] = np.memmap(store_dir(file) / column['file'], dtype=column['dtype'], mode='r', shape=(manifest['rows'],))
+    return arrays
+
+
+# Load the prepared dataset from the binary store, falling back to the CSV (and rebuilding the store)
+def load_prepared(file, columns=None):
+    if is_store_fresh(file):
+        return pd.DataFrame(open_columns(file, columns))
+
+    data = pd.read_csv(file)
+    if 'Date' in data.columns:
+        data['Date'] = pd.to_datetime(data['Date'], format=CSV_DATE_FORMAT)
+    try:
+        save_prepared(data, file)
+    except (OSError, ValueError) as e:
+        print(f"Could not build the prepared store for {file}: {e}")
+    return data if columns is None else data[columns]
@@ -0,0 +1,63 @@
+import numpy as np
+
+
+# ===== Averaging Overlapping Multi-Step Forecasts =====
+# Window i predicts the time steps i, ..., i+pred_len-1, so every time step is covered by up to pred_len windows.
+# The aggregator keeps per-step sums, sums of squares and counts (scatter-added with np.bincount),
+# so forecasts can be fed in any number of batches: a time step is returned as soon as no later window can cover it.
+class OverlapAggregator:
+    def __init__(self, pred_len):
+        self.pred_len = pred_len
+        # Accumulators of the pred_len-1 time steps that can still receive predictions
+        self.sums = np.zeros(pred_len - 1)
+        self.sumsq = np.zeros(pred_len - 1)
+        self.counts = np.zeros(pred_len - 1)
+        # Values are shifted by the first prediction before squaring, to keep the variance accurate
+        self.shift = None
+
+    @staticmethod
+    def _stats(sums, sumsq, counts):
+        mean = sums / counts
+        var = np.maximum(sumsq / counts - mean ** 2, 0.0)
+        return mean, np.sqrt(var)
+
+    # Add forecasts of shape (num_windows, pred_len); returns the mean and std of the completed time steps
+    def update(self, forecasts):
+        forecasts = np.asarray(forecasts, dtype=float).reshape(-1, self.pred_len)
+        num_windows = len(forecasts)
+        if num_windows == 0:
+            return np.empty(0), np.empty(0)
+        if self.shift is None:
+            self.shift = forecasts[0, 0]
+
+        size = num_windows + self.pred_len - 1
+        index = (np.arange(num_windows)[:, None] + np.arange(self.pred_len)).ravel()
+        values = (forecasts - self.shift).ravel()
+        sums = np.bincount(index, weights=values, minlength=size)
+        sumsq = np.bincount(index, weights=values ** 2, minlength=size)
+        counts = np.bincount(index, minlength=size).astype(float)
+
+        # Merge with the steps left open by the previous forecasts
+        open_steps = self.pred_len - 1
+        sums[:open_steps] += self.sums
+        sumsq[:open_steps] += self.sumsq
+        counts[:open_steps] += self.counts
+        self.sums, self.sumsq, self.counts = sums[num_windows:], sumsq[num_windows:], counts[num_windows:]
+
+        mean, std = self._stats(sums[:num_windows], sumsq[:num_windows], counts[:num_windows])
+        return mean + self.shift, std
+
+    # Mean and std of the last pred_len-1 time steps, which are only covered by the last windows
+    def flush(self):
+        valid = self.counts > 0
+        mean, std = self._stats(self.sums[valid], self.sumsq[valid], self.counts[valid])
+        return mean + (self.shift or 0.0), std
+
+
+# Averaged prediction and standard deviation for every time step covered by the forecasts
+def averaged_predictions_per_time_step(predictions):
+    predictions = np.asarray(predictions, dtype=float)
+    aggregator = OverlapAggregator(predictions.shape[1])
+    averaged, std = aggregator.update(predictions)
+    last_averaged, last_std = aggregator.flush()
+    return np.concatenate([averaged, last_averaged]), np.concatenate([std, last_std])
@@ -0,0 +1,48 @@
+import numpy as np
+import torch
+
+
+# ===== Evaluating the Model =====
+# Run the model over a loader and return all the predictions and targets as arrays, plus the average batch loss.
+# Outputs are flattened per sample: (N,) for single-step models and (N, pred_len) for multi-step ones.
+def predict(model, loader, criterion):
+    model.eval()
+    predictions = []
+    actuals = []
+    test_loss = torch.zeros(())
+    with torch.no_grad():
+        for xb, yb in loader:
+            output = model(xb).reshape(len(xb), -1)
+            yb = yb.reshape(len(yb), -1)
+            test_loss += criterion(output, yb)
+            predictions.append(output)
+            actuals.append(yb)
+
+    predictions = torch.cat(predictions).double().numpy()
+    actuals = torch.cat(actuals).double().numpy()
+    if predictions.shape[1] == 1:
+        predictions, actuals = predictions[:, 0], actuals[:, 0]
+    return predictions, actuals, test_loss.item() / len(loader)
+
+
+# Undo the target scaling of a whole array of predictions with a single call
+def inverse_transform(values, scaler):
+    values = np.asarray(values)
+    return scaler.inverse_transform(values.reshape(-1, 1)).reshape(values.shape)
+
+
+# ===== Accuracy-based Loss Calculation =====
+# Number of predictions within threshold % of the target, total number of predictions and accuracy
+def threshold_accuracy(predictions, targets, threshold):
+    predictions = np.asarray(predictions)
+    targets = np.asarray(targets)
+    corrects = int(np.count_nonzero(np.abs(predictions - targets) <= threshold / 100 * np.abs(targets)))
+    total = predictions.size
+    return corrects, total, corrects / total
+
+
+# ===== Average Percentage % Error Calculation =====
+def average_percentage_error(predictions, actuals):
+    predictions = np.asarray(predictions)
+    actuals = np.asarray(actuals)
+    return float(np.mean(np.abs((predictions - actuals) / actuals) * 100))
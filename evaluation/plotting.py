@@ -0,0 +1,88 @@
+import sys
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from utils.paths import run_name
+
+
+# models/<name>_<figure>.png for models/<name>_model.pth
+def figure_path(model_path, figure):
+    model_path = Path(model_path)
+    return model_path.with_name(f'{run_name(model_path)}_{figure}.png')
+
+
+# ===== Figure Writer =====
+# Shows the figures of a run in a window (model_path=None), or in headless mode saves them as models/<name>_<figure>.png.
+# Headless figures are rendered on a background thread with the object-oriented API of matplotlib (no pyplot state,
+# no display needed), so the run goes on while they are drawn. matplotlib is only imported with the first figure.
+class FigureWriter:
+    def __init__(self, model_path=None, figsize=(12, 6)):
+        self.model_path = model_path
+        self.figsize = figsize
+        self.executor = ThreadPoolExecutor(max_workers=1) if model_path is not None else None
+        self.pending = []
+
+    # draw(ax, *args) draws the figure on a matplotlib Axes
+    def plot(self, name, draw, *args):
+        if self.executor is None:
+            import matplotlib.pyplot as plt
+            _, ax = plt.subplots(figsize=self.figsize)
+            draw(ax, *args)
+            plt.show()
+        else:
+            self.pending.append(self.executor.submit(self._save, figure_path(self.model_path, name), draw, args))
+
+    def _save(self, path, draw, args):
+        from matplotlib.figure import Figure
+        fig = Figure(figsize=self.figsize)
+        draw(fig.subplots(), *args)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fig.savefig(path)
+        return path
+
+    # Wait for the figures still being rendered
+    def close(self):
+        if self.executor is None:
+            return
+        for future in self.pending:
+            print(f"Figure saved to {future.result()}")
+        self.pending = []
+        self.executor.shutdown()
+
+
+# ===== Figures =====
+def plot_losses(ax, train_losses, val_losses, starting_epoch, title):
+    ax.plot(range(starting_epoch, len(train_losses) + 1), train_losses[starting_epoch-1:], label='Train Loss', marker='o')
+    ax.plot(range(starting_epoch, len(val_losses) + 1), val_losses[starting_epoch-1:], label='Validation Loss', marker='s')
+    ax.legend()
+    ax.set_xlabel('Epochs')
+    ax.set_ylabel('Loss')
+    ax.set_title(title)
+
+
+def plot_predictions(ax, actuals, predictions, title):
+    ax.plot(actuals, label='Actual', color='blue')
+    ax.plot(predictions, label='Predicted', color='red')
+    ax.set_xlabel("Time")
+    ax.set_ylabel("Price")
+    ax.set_title(title)
+    ax.legend()
+    ax.grid(True)
+
+
+# Averaged multi-step predictions with a band of one standard deviation
+def plot_prediction_stats(ax, averaged_predictions, actuals, stds, title):
+    days = np.arange(len(averaged_predictions))
+    upper = averaged_predictions + stds
+    lower = averaged_predictions - stds
+
+    ax.plot(days, actuals, color='blue', label='Actuals')
+    ax.plot(days, averaged_predictions, color='red', label='Averaged Predictions')
+    ax.fill_between(days, lower, upper, color='orange', alpha=0.3, label='Mean ± Std Dev')
+    ax.set_title(title)
+    ax.set_xlabel("Time Step")
+    ax.set_ylabel("Predicted Value")
+    ax.legend()
+    ax.grid(True)
+    ax.figure.tight_layout()
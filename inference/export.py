@@ -0,0 +1,202 @@
+import sys
+import json
+import time
+import argparse
+import warnings
+import numpy as np
+import torch
+import torch.nn as nn
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from evaluation.metrics import inverse_transform
+
+models_dir = Path(__file__).resolve().parent.parent / 'models'
+export_dir = models_dir / 'export'
+
+# Exported models take the raw features and return the predicted prices: the scalers are part of the graph,
+# so a serving process only needs torch (TorchScript, no model classes) or onnxruntime (ONNX):
+#   models/export/<name>.pt     frozen TorchScript, with the settings as the 'config.json' extra file
+#   models/export/<name>.onnx   ONNX graph (needs the onnx and onnxscript packages to be written)
+#   models/export/<name>.json   settings: features, input shape, seq_len and pred_len
+# Inputs: (batch, features) for the MLPs, (batch, seq_len, features) for the RNNs. Outputs: (batch, pred_len).
+
+
+# ===== Exported Model =====
+# Model with the MinMaxScalers as buffers: scales the inputs, runs the model and undoes the target scaling
+class ExportedForecaster(nn.Module):
+    def __init__(self, model, features_scaler, target_scaler=None):
+        super().__init__()
+        self.model = model
+        self.register_buffer('features_min', torch.tensor(features_scaler.min_, dtype=torch.float32))
+        self.register_buffer('features_scale', torch.tensor(features_scaler.scale_, dtype=torch.float32))
+        # The MLPs are trained on the raw target: an identity scaling keeps a single graph for both kinds
+        target_min = target_scaler.min_ if target_scaler is not None else [0.0]
+        target_scale = target_scaler.scale_ if target_scaler is not None else [1.0]
+        self.register_buffer('target_min', torch.tensor(target_min, dtype=torch.float32))
+        self.register_buffer('target_scale', torch.tensor(target_scale, dtype=torch.float32))
+
+    def forward(self, inputs):
+        x = inputs * self.features_scale + self.features_min
+        out = self.model(x).flatten(1)
+        return (out - self.target_min) / self.target_scale
+
+
+# Raw feature values spread over the range the scaler was fitted on (features on the last axis of shape)
+def sample_inputs(features_scaler, shape, seed=0):
+    scaled = np.random.default_rng(seed).random(shape)
+    return ((scaled - features_scaler.min_) / features_scaler.scale_).astype(np.float32)
+
+
+# The eager pipeline of predict.py: numpy scaling, model forward and inverse scaling of the target
+def eager_predict(model, inputs, features_scaler, target_scaler=None):
+    x = features_scaler.transform(inputs.reshape(-1, inputs.shape[-1])).reshape(inputs.shape)
+    with torch.inference_mode():
+        out = model(torch.as_tensor(x, dtype=torch.float32)).reshape(len(x), -1).double().numpy()
+    return inverse_transform(out, target_scaler) if target_scaler is not None else out
+
+
+# ===== Export =====
+def export_torchscript(forecaster, example, path, config):
+    # TorchScript is deprecated in recent torch versions but still the only format loadable without the model classes
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        warnings.simplefilter('ignore', FutureWarning)
+        warnings.simplefilter('ignore', torch.jit.TracerWarning)
+        with torch.no_grad():
+            module = torch.jit.optimize_for_inference(torch.jit.freeze(torch.jit.trace(forecaster, example)))
+        torch.jit.save(module, path.as_posix(), _extra_files={'config.json': json.dumps(config)})
+    return path
+
+
+# Returns the path, or None when the ONNX packages are not installed
+def export_onnx(forecaster, example, path):
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', DeprecationWarning)
+            torch.onnx.export(forecaster, (example,), path.as_posix(), input_names=['inputs'], output_names=['predictions'],
+                              dynamic_axes={'inputs': {0: 'batch'}, 'predictions': {0: 'batch'}})
+    except (ImportError, torch.onnx.OnnxExporterError) as error:
+        print(f"ONNX export skipped ({error}): install the onnx and onnxscript packages to write it")
+        return None
+    return path
+
+
+# Frozen TorchScript module and its settings, loadable with torch alone
+def load_exported(name, directory=export_dir):
+    extra = {'config.json': ''}
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', FutureWarning)
+        module = torch.jit.load((Path(directory) / f'{name}.pt').as_posix(), map_location='cpu', _extra_files=extra)
+    return module, json.loads(extra['config.json'])
+
+
+def onnx_session(path):
+    try:
+        import onnxruntime
+    except ImportError:
+        print("onnxruntime is not installed: the ONNX model is not checked")
+        return None
+    return onnxruntime.InferenceSession(path.as_posix(), providers=['CPUExecutionProvider'])
+
+
+# ===== Parity and Latency =====
+# Largest difference with the eager pipeline, relative to the predicted price, over several batch sizes
+def parity(runners, reference, inputs_by_size):
+    errors = {}
+    for runner_name, run in runners.items():
+        worst = 0.0
+        for inputs in inputs_by_size:
+            expected = reference(inputs)
+            worst = max(worst, float(np.max(np.abs(run(inputs) - expected) / np.abs(expected))))
+        errors[runner_name] = worst
+    return errors
+
+
+# Median latency of each runner (microseconds per call) for each batch size
+def latency(runners, inputs_by_size, runs):
+    results = {}
+    for runner_name, run in runners.items():
+        for inputs in inputs_by_size:
+            # Warm-up (the TorchScript executor optimizes the graph during the first calls)
+            for _ in range(3):
+                run(inputs)
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                run(inputs)
+                timings.append(time.perf_counter() - start)
+            results[(runner_name, len(inputs))] = float(np.median(timings)) * 1e6
+    return results
+
+
+# (the model classes and the data modules are only imported here, load_exported does not need them)
+def export_model(name, formats=('torchscript', 'onnx'), directory=export_dir, model_path=None, batch_sizes=(1, 256), runs=200, tolerance=1e-4):
+    from inference.predict import MODELS, load_model, load_preprocessing
+    model = load_model(name, model_path)
+    features, features_scaler, target_scaler, seq_len = load_preprocessing(name, model_path)
+    if MODELS[name]['kind'] == 'MLP':
+        target_scaler = None
+    forecaster = ExportedForecaster(model, features_scaler, target_scaler).eval()
+    input_shape = (len(features),) if MODELS[name]['kind'] == 'MLP' else (seq_len, len(features))
+    pred_len = forecaster(torch.zeros((1,) + input_shape)).shape[1]
+    config = {'model': name, 'kind': MODELS[name]['kind'], 'features': features, 'input_shape': list(input_shape),
+              'seq_len': seq_len, 'pred_len': pred_len}
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / f'{name}.json', 'w') as f:
+        json.dump(config, f, indent=2)
+
+    example = torch.from_numpy(sample_inputs(features_scaler, (2,) + input_shape))
+    runners = {'eager': lambda inputs: eager_predict(model, inputs, features_scaler, target_scaler)}
+    if 'torchscript' in formats:
+        path = export_torchscript(forecaster, example, directory / f'{name}.pt', config)
+        print(f"TorchScript model saved to {path}")
+        module, _ = load_exported(name, directory)
+
+        def run_torchscript(inputs):
+            with torch.inference_mode():
+                return module(torch.from_numpy(inputs)).double().numpy()
+        runners['torchscript'] = run_torchscript
+    if 'onnx' in formats:
+        path = export_onnx(forecaster, example, directory / f'{name}.onnx')
+        session = onnx_session(path) if path is not None else None
+        if path is not None:
+            print(f"ONNX model saved to {path}")
+        if session is not None:
+            runners['onnx'] = lambda inputs: session.run(None, {'inputs': inputs})[0].astype(np.float64)
+
+    inputs_by_size = [sample_inputs(features_scaler, (batch_size,) + input_shape, seed) for seed, batch_size in enumerate(batch_sizes)]
+    exported = {runner_name: run for runner_name, run in runners.items() if runner_name != 'eager'}
+    errors = parity(exported, runners['eager'], inputs_by_size)
+    for runner_name, error in errors.items():
+        print(f"  {runner_name} vs eager: max relative difference {error:.2e} ({'OK' if error <= tolerance else 'MISMATCH'})")
+
+    timings = latency(runners, inputs_by_size, runs)
+    print(f"  {'batch':>7}" + ''.join(f"{runner_name:>14}" for runner_name in runners) + '   (median us per call)')
+    for batch_size in batch_sizes:
+        print(f"  {batch_size:>7}" + ''.join(f"{timings[(runner_name, batch_size)]:>14.1f}" for runner_name in runners))
+    return config, errors, timings
+
+
+if __name__ == '__main__':
+    from inference.predict import MODELS
+    parser = argparse.ArgumentParser(description='Export trained models with their scalers to TorchScript and ONNX, and check them against the eager model.')
+    parser.add_argument('--models', nargs='+', default=list(MODELS), choices=list(MODELS), help='Trained models to export (default: all of them)')
+    parser.add_argument('--formats', nargs='+', default=['torchscript', 'onnx'], choices=['torchscript', 'onnx'])
+    parser.add_argument('--output-dir', default=export_dir.as_posix())
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 256], help='Batch sizes of the parity check and latency comparison')
+    parser.add_argument('--runs', type=int, default=200, help='Timed calls per batch size')
+    parser.add_argument('--tolerance', type=float, default=1e-4, help='Largest relative difference with the eager model accepted')
+    args = parser.parse_args()
+
+    failed = []
+    for name in args.models:
+        if not (models_dir / f'{name}_model.pth').exists():
+            print(f"{name}: no trained model in {models_dir}, skipped")
+            continue
+        print(f"{name}:")
+        _, errors, _ = export_model(name, args.formats, args.output_dir, batch_sizes=args.batch_sizes, runs=args.runs, tolerance=args.tolerance)
+        failed += [name for error in errors.values() if error > args.tolerance]
+    if failed:
+        sys.exit(f"Exported models differ from the eager ones: {sorted(set(failed))}")
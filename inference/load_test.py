@@ -0,0 +1,86 @@
+import sys
+import json
+import time
+import argparse
+import threading
+import urllib.request
+import numpy as np
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from data.feature_join import load_features
+from inference.predict import MODELS, dataset_dir, load_model, load_preprocessing, score
+from inference.server import create_server
+
+
+# ===== Load Generator =====
+# Several clients send single-sample requests to the prediction server at the same time,
+# then the client-side latencies are compared with the server stats and the answers with the direct scoring.
+def post(url, inputs):
+    request = urllib.request.Request(url, json.dumps({'inputs': inputs}).encode(), {'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())['predictions']
+
+
+def get(url):
+    with urllib.request.urlopen(url) as response:
+        return json.loads(response.read())
+
+
+def run_client(url, samples, start, step, num_requests, latencies, answers):
+    for i in range(start, start + num_requests * step, step):
+        sample = i % len(samples)
+        t = time.perf_counter()
+        answers[sample] = post(url, samples[sample].tolist())[0]
+        latencies.append(time.perf_counter() - t)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the prediction server with concurrent clients.')
+    parser.add_argument('--model', default='RNN2', choices=list(MODELS))
+    parser.add_argument('--file', default='XAU_1d_data.csv', help='Prepared dataset the requests are taken from')
+    parser.add_argument('--url', help='Server to test (default: start one in this process)')
+    parser.add_argument('--clients', type=int, default=16, help='Number of concurrent clients')
+    parser.add_argument('--requests', type=int, default=200, help='Requests sent by each client')
+    parser.add_argument('--max-batch-size', type=int, default=256)
+    parser.add_argument('--max-wait', type=float, default=2.0, help='Milliseconds, for the in-process server')
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        server = create_server(port=0, names=[args.model], max_batch_size=args.max_batch_size, max_wait=args.max_wait / 1000)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_address[1]}'
+
+    # One request per sample: a row of features for the MLPs, a window of seq_len rows for the RNNs
+    model = load_model(args.model)
+    features, features_scaler, target_scaler, seq_len = load_preprocessing(args.model)
+    data = load_features((dataset_dir / args.file).as_posix(), list(dict.fromkeys(features + ['Close']))).dropna()
+    values = data[features].to_numpy()
+    samples = values if MODELS[args.model]['kind'] == 'MLP' else np.lib.stride_tricks.sliding_window_view(values, seq_len, axis=0).transpose(0, 2, 1)
+
+    latencies = []
+    answers = {}
+    clients = [threading.Thread(target=run_client, args=(f'{url}/predict/{args.model}', samples, i, args.clients, args.requests, latencies, answers))
+               for i in range(args.clients)]
+    start = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array(latencies) * 1000
+    print(f"{len(latencies)} requests from {args.clients} clients in {elapsed:.2f}s: {len(latencies) / elapsed:.0f} requests/s")
+    print(f"Client latency: p50 {np.percentile(latencies, 50):.2f}ms, p95 {np.percentile(latencies, 95):.2f}ms, p99 {np.percentile(latencies, 99):.2f}ms")
+    print(f"Server stats: {json.dumps(get(f'{url}/stats')[args.model], indent=2)}")
+
+    # The batched answers must be the same as scoring the samples directly
+    expected = score(args.model, model, data, features, features_scaler, target_scaler, seq_len)
+    expected = expected[[column for column in expected.columns if column.startswith('prediction')]].to_numpy()
+    rows = sorted(answers)
+    difference = np.max(np.abs(np.array([np.atleast_1d(answers[row]) for row in rows]) - expected[rows]))
+    print(f"Max difference from direct scoring: {difference:.6f}")
+
+    if server is not None:
+        server.shutdown()
@@ -0,0 +1,133 @@
+import sys
+import time
+import argparse
+import pandas as pd
+import torch
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from data.prepared_store import load_prepared
+from data.feature_join import load_features
+from data.MLP_data_processing import FEATURES, split_data
+from evaluation.metrics import inverse_transform
+from training.checkpoint import load_scalers
+from MLP.MLP1_network import FullyConnected as FullyConnected1
+from MLP.MLP2_network import FullyConnected as FullyConnected2
+from RNN.RNN_network import RNN
+
+root_dir = Path(__file__).resolve().parent.parent
+dataset_dir = root_dir / 'data' / 'dataset'
+models_dir = root_dir / 'models'
+
+# Trained models and the input sequence length they are trained with (see the training scripts),
+# used when the model was saved without its scalers and settings
+MODELS = {
+    'MLP1': {'kind': 'MLP'},
+    'MLP2': {'kind': 'MLP'},
+    'RNN1': {'kind': 'RNN', 'seq_len': 7},
+    'RNN2': {'kind': 'RNN', 'seq_len': 30},
+}
+
+
+# ===== Loading the Model =====
+# Rebuild the architecture from the shapes of the saved weights
+def build_model(name, state):
+    if name == 'MLP1':
+        model = FullyConnected1(state['fc1.weight'].shape[1], state['fc1.weight'].shape[0], state['fc2.weight'].shape[0])
+    elif name == 'MLP2':
+        model = FullyConnected2(state['fc1.weight'].shape[1], state['fc1.weight'].shape[0], state['fc2.weight'].shape[0], state['fc3.weight'].shape[0])
+    else:
+        num_layers = sum(1 for key in state if key.startswith('rnn.weight_ih_l'))
+        model = RNN(state['rnn.weight_ih_l0'].shape[1], state['rnn.weight_hh_l0'].shape[1], num_layers, state['fc.weight'].shape[0])
+    model.load_state_dict(state)
+    model.eval()
+    return model
+
+
+def load_model(name, model_path=None):
+    model_path = model_path or models_dir / f'{name}_model.pth'
+    return build_model(name, torch.load(model_path, weights_only=False))
+
+
+# Refit the scalers on the training split of the file the model was trained on, like the data loaders do
+def fit_scalers(name, train_file):
+    from sklearn.preprocessing import MinMaxScaler
+    data = load_prepared((dataset_dir / train_file).as_posix(), FEATURES)
+    training, _, _ = split_data(data)
+    features_scaler = MinMaxScaler().fit(training[FEATURES])
+    target_scaler = MinMaxScaler().fit(training[['future_close']]) if MODELS[name]['kind'] == 'RNN' else None
+    return features_scaler, target_scaler
+
+
+# Features, scalers and settings saved with the model, refitting the scalers only for older checkpoints
+def load_preprocessing(name, model_path=None, train_file='XAU_1d_data.csv'):
+    model_path = model_path or models_dir / f'{name}_model.pth'
+    saved = load_scalers(model_path)
+    if saved is not None:
+        features, features_scaler, target_scaler, config = saved
+        return features, features_scaler, target_scaler, config.get('seq_len', MODELS[name].get('seq_len', 1))
+
+    print(f"No saved scalers for {name}, refitting them on {train_file}.")
+    features_scaler, target_scaler = fit_scalers(name, train_file)
+    return list(FEATURES), features_scaler, target_scaler, MODELS[name].get('seq_len', 1)
+
+
+# ===== Scoring =====
+# Forward pass over contiguous slices of the inputs, with no autograd bookkeeping
+def forward_in_batches(model, inputs, batch_size):
+    with torch.inference_mode():
+        outputs = [model(inputs[start:start + batch_size]) for start in range(0, len(inputs), batch_size)]
+    return torch.cat(outputs).reshape(len(inputs), -1).double().numpy()
+
+
+# One row per scored bar: its position in the prepared file, its Close and the predicted next Close(s)
+def score(name, model, data, features, features_scaler, target_scaler=None, seq_len=1, batch_size=8192):
+    if len(data) < seq_len:
+        raise ValueError(f"{name} needs at least {seq_len} rows to make a prediction, got {len(data)}")
+    x = torch.as_tensor(features_scaler.transform(data[features]), dtype=torch.float32)
+
+    if MODELS[name]['kind'] == 'MLP':
+        predictions = forward_in_batches(model, x, batch_size)
+        rows = data.index
+    else:
+        # Window i uses the bars i..i+seq_len-1 and predicts the following pred_len bars
+        windows = x.unfold(0, seq_len, 1).transpose(1, 2)
+        predictions = inverse_transform(forward_in_batches(model, windows, batch_size), target_scaler)
+        rows = data.index[seq_len - 1:]
+
+    output = pd.DataFrame({'row': rows, 'Close': data['Close'].to_numpy()[len(data) - len(rows):]})
+    if predictions.shape[1] == 1:
+        output['prediction'] = predictions[:, 0]
+    else:
+        for step in range(predictions.shape[1]):
+            output[f'prediction_t+{step + 1}'] = predictions[:, step]
+    return output
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Score a prepared dataset with a trained model, without retraining it.')
+    parser.add_argument('--model', required=True, choices=list(MODELS), help='Trained model to use (weights in models/<model>_model.pth)')
+    parser.add_argument('--file', required=True, help="Prepared dataset to score (e.g. 'XAU_1h_data.csv')")
+    parser.add_argument('--train-file', default='XAU_1d_data.csv', help='Dataset the model was trained on, used to refit the scalers if they were not saved')
+    parser.add_argument('--output', help='Where to write the predictions (default: predictions/<model>_<file>)')
+    parser.add_argument('--batch-size', type=int, default=8192)
+    parser.add_argument('--quantized', action='store_true', help='Score with the int8 quantized model (see quantize.py)')
+    parser.add_argument('--float-recurrent', action='store_true', help='With --quantized, keep the recurrent layers of the RNNs in float')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    model = load_model(args.model)
+    if args.quantized:
+        from inference.quantize import quantize_model
+        model = quantize_model(model, recurrent=not args.float_recurrent)
+    features, features_scaler, target_scaler, seq_len = load_preprocessing(args.model, train_file=args.train_file)
+    data = load_features((dataset_dir / args.file).as_posix(), list(dict.fromkeys(features + ['Close']))).dropna()
+    print(f"Loaded model and data in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    predictions = score(args.model, model, data, features, features_scaler, target_scaler, seq_len, args.batch_size)
+    print(f"Scored {len(predictions)} rows in {time.perf_counter() - start:.2f}s")
+
+    output = Path(args.output) if args.output else root_dir / 'predictions' / f'{args.model}_{Path(args.file).name}'
+    output.parent.mkdir(parents=True, exist_ok=True)
+    predictions.to_csv(output, index=False)
+    print(f"Predictions saved to {output}")
@@ -0,0 +1,187 @@
+import sys
+import copy
+import json
+import time
+import argparse
+import warnings
+import numpy as np
+import torch
+import torch.nn as nn
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from evaluation.metrics import predict, inverse_transform, threshold_accuracy, average_percentage_error
+from inference.predict import MODELS, models_dir, load_model, load_preprocessing
+
+# Dynamic int8 quantization: the weights of the Linear layers are stored as int8 and the activations are quantized
+# on the fly at each call, so no calibration data is needed. torch only quantizes the LSTM/GRU layers, not nn.RNN:
+# the RNN layers are unrolled into their input and recurrent Linear layers first, so that they are quantized too.
+
+
+# ===== Unrolled RNN =====
+# Same computation as a (batch_first) nn.RNN, written with one Linear for the input projection of all the time steps
+# and one for the recurrent projection of each step: h_t = tanh(W_ih x_t + b_ih + b_hh + W_hh h_(t-1)), with h_0 = 0
+class UnrolledRNN(nn.Module):
+    def __init__(self, rnn):
+        super().__init__()
+        self.activation = torch.tanh if rnn.nonlinearity == 'tanh' else torch.relu
+        self.input_layers = nn.ModuleList()
+        self.hidden_layers = nn.ModuleList()
+        for layer in range(rnn.num_layers):
+            weight_ih, weight_hh = getattr(rnn, f'weight_ih_l{layer}'), getattr(rnn, f'weight_hh_l{layer}')
+            input_layer = nn.Linear(weight_ih.shape[1], weight_ih.shape[0])
+            hidden_layer = nn.Linear(weight_hh.shape[1], weight_hh.shape[0], bias=False)
+            with torch.no_grad():
+                input_layer.weight.copy_(weight_ih)
+                input_layer.bias.copy_(getattr(rnn, f'bias_ih_l{layer}') + getattr(rnn, f'bias_hh_l{layer}'))
+                hidden_layer.weight.copy_(weight_hh)
+            self.input_layers.append(input_layer)
+            self.hidden_layers.append(hidden_layer)
+
+    def forward(self, x):
+        last_hidden = []
+        for input_layer, hidden_layer in zip(self.input_layers, self.hidden_layers):
+            projected = input_layer(x)
+            h = self.activation(projected[:, 0])
+            outputs = [h]
+            for step in range(1, x.shape[1]):
+                h = self.activation(projected[:, step] + hidden_layer(h))
+                outputs.append(h)
+            x = torch.stack(outputs, dim=1)
+            last_hidden.append(h)
+        return x, torch.stack(last_hidden)
+
+
+# Quantized copy of a FullyConnected or RNN model (recurrent=False keeps the recurrent layers in float)
+def quantize_model(model, recurrent=True):
+    try:
+        from torch.ao.quantization import quantize_dynamic
+    except ImportError:
+        from torch.quantization import quantize_dynamic
+    model = copy.deepcopy(model).eval()
+    if recurrent and isinstance(getattr(model, 'rnn', None), nn.RNN):
+        model.rnn = UnrolledRNN(model.rnn)
+    # torch.ao.quantization is deprecated in favour of torchao, but still the only dynamic quantization in torch itself
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        warnings.simplefilter('ignore', UserWarning)
+        return quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+# ===== Accuracy Drift =====
+# Test split of the file the model was trained on, with the same features, windows and scalers as in training
+def load_test_split(name, filename, batch_size=256):
+    features, _, _, seq_len = load_preprocessing(name)
+    if MODELS[name]['kind'] == 'MLP':
+        from data.MLP_data_processing import load_and_process_data
+        _, _, test_loader, _, _, _ = load_and_process_data(filename, batch_size, features=features)
+        return test_loader, None
+    from data.RNN_data_processing import load_and_process_data
+    pred_len = load_model(name).fc.out_features
+    _, _, test_loader, _, _, _, target_scaler = load_and_process_data(filename, seq_len, pred_len, batch_size, features=features)
+    return test_loader, target_scaler
+
+
+def test_metrics(model, test_loader, target_scaler, threshold):
+    predictions, actuals, _ = predict(model, test_loader, nn.MSELoss())
+    if target_scaler is not None:
+        predictions = inverse_transform(predictions, target_scaler)
+        actuals = inverse_transform(actuals, target_scaler)
+    _, _, accuracy = threshold_accuracy(predictions, actuals, threshold)
+    return predictions, {'accuracy': accuracy * 100, 'avg_percent_error': average_percentage_error(predictions, actuals)}
+
+
+# ===== Throughput =====
+# Samples per second of the forward pass, cycling over the test inputs in batches of batch_size
+def throughput(model, inputs, batch_size, min_seconds=1.0):
+    batches = [inputs[start:start + batch_size] for start in range(0, len(inputs) - batch_size + 1, batch_size)] or [inputs]
+    samples = 0
+    with torch.inference_mode():
+        model(batches[0])    # Warm-up
+        start = time.perf_counter()
+        while time.perf_counter() - start < min_seconds:
+            for xb in batches:
+                model(xb)
+                samples += len(xb)
+    return samples / (time.perf_counter() - start)
+
+
+# ===== Comparison =====
+# Test metrics and throughput of the float and quantized models. The quantized model is within tolerance when the accuracy
+# (in % of predictions within the threshold) drops by at most max_accuracy_drop points and the average % error grows
+# by at most max_error_increase points, and worth adopting when it is also at least min_speedup times faster
+# at the largest batch size.
+def compare(name, filename='XAU_1d_data.csv', threshold=1, batch_sizes=(1, 256), max_accuracy_drop=0.5, max_error_increase=0.1,
+            min_speedup=1.1, recurrent=True):
+    model = load_model(name)
+    quantized = quantize_model(model, recurrent)
+    test_loader, target_scaler = load_test_split(name, filename)
+
+    float_predictions, float_metrics = test_metrics(model, test_loader, target_scaler, threshold)
+    quantized_predictions, quantized_metrics = test_metrics(quantized, test_loader, target_scaler, threshold)
+    drift = np.abs(quantized_predictions - float_predictions) / np.abs(float_predictions) * 100
+
+    inputs = torch.cat([xb for xb, _ in test_loader])
+    speed = {batch_size: (throughput(model, inputs, batch_size), throughput(quantized, inputs, batch_size)) for batch_size in batch_sizes}
+
+    accuracy_drop = float_metrics['accuracy'] - quantized_metrics['accuracy']
+    error_increase = quantized_metrics['avg_percent_error'] - float_metrics['avg_percent_error']
+    within_tolerance = accuracy_drop <= max_accuracy_drop and error_increase <= max_error_increase
+    float_speed, quantized_speed = speed[max(batch_sizes)]
+    faster = quantized_speed >= min_speedup * float_speed
+    return {
+        'model': name,
+        'file': filename,
+        'quantized_recurrent': recurrent and MODELS[name]['kind'] == 'RNN',
+        'test_samples': len(inputs),
+        'float': float_metrics,
+        'quantized': quantized_metrics,
+        'accuracy_drop': accuracy_drop,
+        'error_increase': error_increase,
+        'mean_prediction_drift_percent': float(drift.mean()),
+        'max_prediction_drift_percent': float(drift.max()),
+        'throughput': {str(batch_size): {'float': f, 'quantized': q, 'speedup': q / f} for batch_size, (f, q) in speed.items()},
+        'within_tolerance': bool(within_tolerance),
+        'adopt': bool(within_tolerance and faster),
+    }
+
+
+def print_report(report, threshold):
+    print(f"{report['model']} ({report['test_samples']} test samples of {report['file']}):")
+    for kind in ('float', 'quantized'):
+        metrics = report[kind]
+        print(f"  {kind:>9}: accuracy {metrics['accuracy']:.4f}% within {threshold}%, average % error {metrics['avg_percent_error']:.4f}%")
+    print(f"  Drift: accuracy {-report['accuracy_drop']:+.4f} points, average % error {report['error_increase']:+.4f} points, "
+          f"predictions {report['mean_prediction_drift_percent']:.4f}% on average ({report['max_prediction_drift_percent']:.4f}% at most)")
+    for batch_size, speed in report['throughput'].items():
+        print(f"  Batch {batch_size:>5}: {speed['float']:12,.0f} -> {speed['quantized']:12,.0f} samples/s (x{speed['speedup']:.2f})")
+    if report['adopt']:
+        print("  Within tolerance and faster: use the quantized model")
+    elif report['within_tolerance']:
+        print("  Within tolerance but not faster: keep the float model")
+    else:
+        print("  Out of tolerance: keep the float model")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Quantize trained models to int8 and compare their test accuracy and throughput with the float models.')
+    parser.add_argument('--models', nargs='+', default=list(MODELS), choices=list(MODELS), help='Trained models to compare (default: all of them)')
+    parser.add_argument('--file', default='XAU_1d_data.csv', help='Dataset the models were trained on (its test split is used)')
+    parser.add_argument('--threshold', type=float, default=1, help='%% threshold of the accuracy')
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 256])
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.5, help='Largest accepted accuracy drop (percentage points)')
+    parser.add_argument('--max-error-increase', type=float, default=0.1, help='Largest accepted average %% error increase (percentage points)')
+    parser.add_argument('--min-speedup', type=float, default=1.1, help='Smallest throughput gain for the quantized model to be worth using')
+    parser.add_argument('--float-recurrent', action='store_true', help='Only quantize the Linear layers of the RNNs, not the recurrent ones')
+    args = parser.parse_args()
+
+    for name in args.models:
+        if not (models_dir / f'{name}_model.pth').exists():
+            print(f"{name}: no trained model in {models_dir}, skipped")
+            continue
+        report = compare(name, args.file, args.threshold, args.batch_sizes, args.max_accuracy_drop, args.max_error_increase,
+                         args.min_speedup, not args.float_recurrent)
+        print_report(report, args.threshold)
+        path = models_dir / f'{name}_quantization.json'
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {path}\n")
@@ -0,0 +1,202 @@
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+import numpy as np
+import torch
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from evaluation.metrics import inverse_transform
+from inference.predict import MODELS, models_dir, load_model, load_preprocessing
+
+
+# ===== Micro-batching =====
+# Requests for the same model are queued and a single worker thread serves them: it takes the first waiting request,
+# keeps collecting requests until max_batch_size samples are gathered or max_wait seconds have passed,
+# and runs one forward pass for all of them. The model stays loaded and warm between requests.
+class ModelWorker:
+    def __init__(self, name, max_batch_size=256, max_wait=0.002):
+        self.name = name
+        self.model = load_model(name)
+        self.features, self.features_scaler, self.target_scaler, self.seq_len = load_preprocessing(name)
+        self.kind = MODELS[name]['kind']
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.stats = ServingStats()
+
+        # Warm-up pass, so the first request does not pay for the lazy initialisations
+        shape = (1, len(self.features)) if self.kind == 'MLP' else (1, self.seq_len, len(self.features))
+        with torch.inference_mode():
+            self.model(torch.zeros(shape))
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    # Queue the raw (unscaled) inputs of one request: (N, features) for the MLPs or (N, seq_len, features) for the RNNs
+    def submit(self, inputs):
+        inputs = np.asarray(inputs, dtype=np.float64)
+        shape = (len(self.features),) if self.kind == 'MLP' else (self.seq_len, len(self.features))
+        if inputs.shape == shape:
+            inputs = inputs[None]
+        if inputs.shape[1:] != shape or len(inputs) == 0:
+            raise ValueError(f"{self.name} expects inputs of shape (N, {', '.join(map(str, shape))}), got {inputs.shape}")
+        future = Future()
+        self.requests.put((inputs, future, time.perf_counter()))
+        return future
+
+    def _collect(self):
+        batch = [self.requests.get()]
+        size = len(batch[0][0])
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                request = self.requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request[0])
+        return batch
+
+    def _serve(self):
+        while True:
+            batch = self._collect()
+            try:
+                inputs = np.concatenate([request[0] for request in batch])
+                x = self.features_scaler.transform(inputs.reshape(-1, len(self.features))).reshape(inputs.shape)
+                with torch.inference_mode():
+                    outputs = self.model(torch.as_tensor(x, dtype=torch.float32)).reshape(len(x), -1).double().numpy()
+                if self.kind == 'RNN':
+                    outputs = inverse_transform(outputs, self.target_scaler)
+            except Exception as error:
+                for _, future, _ in batch:
+                    future.set_exception(error)
+                continue
+
+            start = 0
+            now = time.perf_counter()
+            for inputs, future, submitted in batch:
+                future.set_result(outputs[start:start + len(inputs)])
+                start += len(inputs)
+                self.stats.record(now - submitted, len(inputs))
+            self.stats.record_batch(len(outputs))
+
+
+# ===== Throughput and Latency Stats =====
+class ServingStats:
+    def __init__(self, window=10000):
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.latencies = deque(maxlen=window)    # Latencies of the most recent requests
+        self.num_requests = 0
+        self.num_samples = 0
+        self.num_batches = 0
+        self.num_batched_samples = 0    # Samples of the batched model calls (for the average batch size)
+
+    def record(self, latency, num_samples):
+        with self.lock:
+            self.latencies.append(latency)
+            self.num_requests += 1
+            self.num_samples += num_samples
+
+    def record_batch(self, num_samples):
+        with self.lock:
+            self.num_batches += 1
+            self.num_batched_samples += num_samples
+
+    def summary(self):
+        with self.lock:
+            elapsed = time.perf_counter() - self.started
+            latencies = np.array(self.latencies) * 1000
+            summary = {
+                'requests': self.num_requests,
+                'samples': self.num_samples,
+                'batches': self.num_batches,
+                'avg_batch_size': self.num_batched_samples / self.num_batches if self.num_batches else 0.0,
+                'requests_per_sec': self.num_requests / elapsed,
+                'samples_per_sec': self.num_samples / elapsed,
+            }
+        if len(latencies):
+            for p in (50, 95, 99):
+                summary[f'latency_p{p}_ms'] = float(np.percentile(latencies, p))
+        return summary
+
+
+# ===== HTTP Interface =====
+# POST /predict/<model> with {"inputs": [...]} -> {"predictions": [...]}, in price units
+# GET /models -> models served and their input shapes, GET /stats -> throughput and latency of every model
+class PredictionHandler(BaseHTTPRequestHandler):
+    workers = {}
+    timeout_seconds = 30
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._send(200, {name: worker.stats.summary() for name, worker in self.workers.items()})
+        elif self.path == '/models':
+            self._send(200, {name: {'kind': worker.kind, 'features': worker.features, 'seq_len': worker.seq_len}
+                             for name, worker in self.workers.items()})
+        else:
+            self._send(404, {'error': f'Unknown path {self.path}'})
+
+    def do_POST(self):
+        name = self.path.rsplit('/', 1)[-1]
+        if not self.path.startswith('/predict/') or name not in self.workers:
+            self._send(404, {'error': f'Unknown model or path {self.path}, models served: {list(self.workers)}'})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            future = self.workers[name].submit(body['inputs'])
+        except (ValueError, KeyError, TypeError) as error:
+            self._send(400, {'error': str(error)})
+            return
+        try:
+            predictions = future.result(timeout=self.timeout_seconds)
+        except Exception as error:
+            self._send(500, {'error': str(error)})
+            return
+        self._send(200, {'predictions': predictions.tolist()})
+
+    # Keep the console quiet, the stats endpoint reports the traffic
+    def log_message(self, format, *args):
+        pass
+
+
+# Load every trained model found in models/ (or only the given ones) and build the server
+def create_server(host='127.0.0.1', port=8000, names=None, max_batch_size=256, max_wait=0.002):
+    names = names or [name for name in MODELS if (models_dir / f'{name}_model.pth').exists()]
+    if not names:
+        raise FileNotFoundError(f"No trained models found in {models_dir}, train one first")
+    workers = {name: ModelWorker(name, max_batch_size, max_wait) for name in names}
+    handler = type('Handler', (PredictionHandler,), {'workers': workers})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the trained models over HTTP, batching concurrent requests together.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--models', nargs='+', choices=list(MODELS), help='Models to serve (default: all the trained ones)')
+    parser.add_argument('--max-batch-size', type=int, default=256, help='Maximum number of samples in one forward pass')
+    parser.add_argument('--max-wait', type=float, default=2.0, help='Milliseconds to wait for more requests before running a batch')
+    args = parser.parse_args()
+
+    server = create_server(args.host, args.port, args.models, args.max_batch_size, args.max_wait / 1000)
+    print(f"Serving {', '.join(server.RequestHandlerClass.workers)} on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,120 @@
+import sys
+import time
+import argparse
+import numpy as np
+import torch
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from data.indicator_engine import IndicatorEngine, LOOKBACK
+from data.prepared_store import load_prepared
+from inference.predict import MODELS, dataset_dir, load_model, load_preprocessing, score
+
+
+# ===== Streaming RNN Predictor =====
+# Forecasts bar by bar without re-running the RNN over the whole window for every new bar.
+# The trained model always starts from a zero hidden state at the first bar of its window, so the predictor keeps
+# seq_len hidden states, one per window start: every new bar advances all of them with a single batched step,
+# the one that has now seen exactly seq_len bars gives the forecast, and its slot restarts from zero at the next bar.
+# The indicators and the scaling are updated incrementally too, so every bar costs the same small amount of work.
+class StreamingRNNPredictor:
+    def __init__(self, model, features, features_scaler, target_scaler, seq_len, engine=None):
+        self.features = features
+        self.features_scaler = features_scaler
+        self.target_scaler = target_scaler
+        self.seq_len = seq_len
+        self.engine = engine or IndicatorEngine()
+
+        rnn = model.rnn
+        self.num_layers = rnn.num_layers
+        self.activation = torch.tanh if rnn.nonlinearity == 'tanh' else torch.relu
+        with torch.no_grad():
+            self.w_ih = [getattr(rnn, f'weight_ih_l{l}').detach().t().contiguous() for l in range(self.num_layers)]
+            self.w_hh = [getattr(rnn, f'weight_hh_l{l}').detach().t().contiguous() for l in range(self.num_layers)]
+            self.b_ih = [getattr(rnn, f'bias_ih_l{l}').detach() for l in range(self.num_layers)]
+            self.b_hh = [getattr(rnn, f'bias_hh_l{l}').detach() for l in range(self.num_layers)]
+            self.w_fc = model.fc.weight.detach().t().contiguous()
+            self.b_fc = model.fc.bias.detach()
+
+        # hidden[l, s]: layer l state of the window started at the bars n with n % seq_len == s
+        self.hidden = torch.zeros(self.num_layers, seq_len, rnn.hidden_size)
+        self.num_bars = 0
+
+    # Add one bar of already computed (unscaled) features; returns the forecast once seq_len bars have been seen
+    def push_features(self, values):
+        x = torch.as_tensor(self.features_scaler.transform(np.asarray(values, dtype=np.float64).reshape(1, -1))[0], dtype=torch.float32)
+        slot = self.num_bars % self.seq_len
+        with torch.inference_mode():
+            self.hidden[:, slot] = 0
+            layer_input = x @ self.w_ih[0] + self.b_ih[0]
+            for l in range(self.num_layers):
+                self.hidden[l] = self.activation(layer_input + self.hidden[l] @ self.w_hh[l] + self.b_hh[l])
+                if l + 1 < self.num_layers:
+                    layer_input = self.hidden[l] @ self.w_ih[l + 1] + self.b_ih[l + 1]
+
+            self.num_bars += 1
+            if self.num_bars < self.seq_len:
+                return None
+            # The window that started seq_len-1 bars ago is complete
+            output = self.hidden[-1, self.num_bars % self.seq_len] @ self.w_fc + self.b_fc
+        return self.target_scaler.inverse_transform(output.double().numpy().reshape(-1, 1)).ravel()
+
+    # Add one raw OHLCV bar; returns the forecast of the next pred_len closes, or None while warming up.
+    # Bars with a missing indicator are skipped, like the rows dropped by data_preparation.py.
+    def update(self, open, high, low, close, volume):
+        row = self.engine.update(close, high, low)
+        row.update({'Open': open, 'High': high, 'Low': low, 'Close': close, 'Volume': volume})
+        values = [row[feature] for feature in self.features]
+        if any(np.isnan(value) for value in values):
+            return None
+        return self.push_features(values)
+
+    # Start from the end of a prepared dataset: the indicator state from its last LOOKBACK+1 rows
+    # and the hidden states from its last seq_len-1 rows, so the next bar already gives a forecast
+    @classmethod
+    def from_prepared(cls, model, features, features_scaler, target_scaler, seq_len, tail):
+        predictor = cls(model, features, features_scaler, target_scaler, seq_len, IndicatorEngine.from_prepared(tail))
+        for values in tail[features].to_numpy()[-(seq_len - 1):] if seq_len > 1 else []:
+            predictor.push_features(values)
+        return predictor
+
+
+def load_streaming_predictor(name, tail=None, model_path=None):
+    model = load_model(name, model_path)
+    features, features_scaler, target_scaler, seq_len = load_preprocessing(name, model_path)
+    if tail is None:
+        return StreamingRNNPredictor(model, features, features_scaler, target_scaler, seq_len)
+    return StreamingRNNPredictor.from_prepared(model, features, features_scaler, target_scaler, seq_len, tail)
+
+
+# ===== Replay =====
+# Stream the last bars of a prepared dataset one at a time, checking the forecasts against the windowed model
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay a prepared dataset bar by bar through the streaming RNN predictor.')
+    parser.add_argument('--model', default='RNN2', choices=[name for name in MODELS if MODELS[name]['kind'] == 'RNN'])
+    parser.add_argument('--file', default='XAU_1d_data.csv', help='Prepared dataset to replay')
+    parser.add_argument('--bars', type=int, default=1000, help='Number of bars to stream at the end of the file')
+    args = parser.parse_args()
+
+    data = load_prepared((dataset_dir / args.file).as_posix()).dropna().reset_index(drop=True)
+    start = len(data) - args.bars
+    if start < LOOKBACK + 1:
+        parser.error(f'The file has only {len(data)} rows, use at most {len(data) - LOOKBACK - 1} bars')
+    predictor = load_streaming_predictor(args.model, data.iloc[start - LOOKBACK - 1:start])
+
+    forecasts = []
+    latencies = []
+    for bar in data.iloc[start:][['Open', 'High', 'Low', 'Close', 'Volume']].itertuples(index=False):
+        t = time.perf_counter()
+        forecasts.append(predictor.update(*bar))
+        latencies.append(time.perf_counter() - t)
+    forecasts = np.array(forecasts)
+
+    # Same forecasts from the windowed model, over the same bars
+    model = load_model(args.model)
+    features, features_scaler, target_scaler, seq_len = load_preprocessing(args.model)
+    windowed = score(args.model, model, data.iloc[start - seq_len + 1:], features, features_scaler, target_scaler, seq_len)
+    windowed = windowed[[column for column in windowed.columns if column.startswith('prediction')]].to_numpy()
+
+    latencies = np.array(latencies) * 1e6
+    print(f"Streamed {len(forecasts)} bars: latency per bar p50 {np.percentile(latencies, 50):.1f}us, p99 {np.percentile(latencies, 99):.1f}us")
+    print(f"Max difference from the windowed model: {np.max(np.abs(forecasts - windowed)):.6f}")
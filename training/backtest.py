@@ -0,0 +1,225 @@
+import os
+import sys
+import time
+import argparse
+import contextlib
+import numpy as np
+import pandas as pd
+import torch
+import torch.multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from torch.utils.data import TensorDataset
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from data.prepared_store import load_prepared
+from data.RNN_data_processing import FEATURES, SlidingWindowDataset
+from data.batching import TensorBatchLoader
+from training.trainer import train_model
+from training.checkpoint import FittedScaler, save_scalers
+from training.scripts import SCRIPTS, load_script, is_recurrent
+from evaluation.metrics import predict, inverse_transform, threshold_accuracy, average_percentage_error
+
+root_dir = Path(__file__).resolve().parent.parent
+
+
+# ===== Walk-forward Folds =====
+# Rolling (or expanding, from the first row) train/val/test windows moved forward by `step` rows,
+# as (start, stop) row ranges: the folds are only indices into the single copy of the dataset
+def walk_forward_folds(num_rows, train_size, val_size, test_size, step=None, expanding=False):
+    step = step or test_size
+    folds = []
+    start = 0
+    while start + train_size + val_size + test_size <= num_rows:
+        train_end = start + train_size
+        val_end = train_end + val_size
+        folds.append({'train': (0 if expanding else start, train_end), 'val': (train_end, val_end), 'test': (val_end, val_end + test_size)})
+        start += step
+    return folds
+
+
+# The whole series with its target (the next Close), loaded once as float32 tensors.
+# The last row of each fold range targets the first Close of the next range: it is dropped (see fold_rows).
+def load_series(filename):
+    file_path = (root_dir / 'data' / 'dataset' / filename).as_posix()
+    data = load_prepared(file_path, list(FEATURES)).dropna()
+    data['future_close'] = data['Close'].shift(-1)
+    data = data.dropna()
+    return torch.tensor(data[FEATURES].values, dtype=torch.float32), torch.tensor(data[['future_close']].values, dtype=torch.float32)
+
+
+# MinMaxScaler fitted on the training rows of a fold (same formula as sklearn)
+def fit_fold_scaler(values):
+    values = np.asarray(values, dtype=np.float64)
+    data_min = values.min(axis=0)
+    data_range = values.max(axis=0) - data_min
+    scale = 1.0 / np.where(data_range == 0, 1.0, data_range)
+    return FittedScaler(-data_min * scale, scale)
+
+
+# ===== Scaling per Batch =====
+# Wraps a loader over the unscaled rows and scales each batch as it is drawn,
+# so every fold uses its own scalers without a scaled copy of the dataset
+class ScaledLoader:
+    def __init__(self, loader, features_scaler, target_scaler=None):
+        self.loader = loader
+        self.x_min = torch.as_tensor(features_scaler.min_, dtype=torch.float32)
+        self.x_scale = torch.as_tensor(features_scaler.scale_, dtype=torch.float32)
+        self.target_scaler = target_scaler
+        if target_scaler is not None:
+            self.y_min = torch.as_tensor(target_scaler.min_, dtype=torch.float32)
+            self.y_scale = torch.as_tensor(target_scaler.scale_, dtype=torch.float32)
+
+    def __len__(self):
+        return len(self.loader)
+
+    def __iter__(self):
+        for xb, yb in self.loader:
+            if self.target_scaler is not None:
+                yb = yb * self.y_scale + self.y_min
+            yield xb * self.x_scale + self.x_min, yb
+
+
+# Rows of a fold range that are used: the last one is dropped, like split_data drops the last row of each split,
+# since its target is the first Close of the following range
+def fold_rows(rows):
+    start, stop = rows
+    return start, stop - 1
+
+
+# Loader over the rows [start, stop - 1) of the series: the datasets only hold views of the shared tensors
+def fold_loader(script, values, target, rows, features_scaler, target_scaler):
+    start, stop = fold_rows(rows)
+    if is_recurrent(script):
+        dataset = SlidingWindowDataset(values[start:stop], target[start:stop], script.seq_len, script.pred_len)
+    else:
+        dataset = TensorDataset(values[start:stop], target[start:stop])
+        target_scaler = None    # The MLPs are trained on the raw target, like in MLP_data_processing.py
+    return ScaledLoader(TensorBatchLoader(dataset, script.batch_size), features_scaler, target_scaler)
+
+
+# ===== Running a Fold =====
+# Train on the fold (starting from initial_state if given), then evaluate on its test window
+def run_fold(name, fold_index, fold, values, target, settings, initial_state=None):
+    start_time = time.perf_counter()
+    torch.manual_seed(settings['seed'] + fold_index)
+    script = load_script(name)
+    train_start, train_stop = fold_rows(fold['train'])
+    features_scaler = fit_fold_scaler(values[train_start:train_stop].numpy())
+    target_scaler = fit_fold_scaler(target[train_start:train_stop].numpy())
+    train_loader, val_loader, test_loader = [fold_loader(script, values, target, fold[split], features_scaler, target_scaler)
+                                             for split in ('train', 'val', 'test')]
+
+    # Same model, criterion and optimizer as the training script (the weights are loaded in place, after the optimizer is built)
+    model, criterion, optimizer = script.build_model(len(FEATURES))
+    num_epochs = settings['epochs']
+    if initial_state is not None:
+        model.load_state_dict(initial_state)
+        num_epochs = settings['finetune_epochs']
+    model_path = (root_dir / 'models' / 'backtest' / name / f'fold_{fold_index}_model.pth').as_posix()
+    if is_recurrent(script):
+        save_scalers(model_path, FEATURES, features_scaler, target_scaler, seq_len=script.seq_len, pred_len=script.pred_len)
+    else:
+        save_scalers(model_path, FEATURES, features_scaler)
+
+    # The epoch logs are not printed, only the summary of each fold
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        train_losses, val_losses = train_model(model, train_loader, val_loader, criterion, optimizer, num_epochs,
+                                               settings['patience'], model_path, checkpoint_every=0)
+    model.load_state_dict(torch.load(model_path, weights_only=False))
+
+    predictions, actuals, test_loss = predict(model, test_loader, criterion)
+    if is_recurrent(script):
+        predictions = inverse_transform(predictions, target_scaler)
+        actuals = inverse_transform(actuals, target_scaler)
+    _, _, accuracy = threshold_accuracy(predictions, actuals, settings['threshold'])
+    result = {
+        'fold': fold_index,
+        'train_start': fold['train'][0], 'train_end': fold['train'][1],
+        'test_start': fold['test'][0], 'test_end': fold['test'][1],
+        'epochs': len(val_losses),
+        'best_val_loss': min(val_losses),
+        'test_loss': test_loss,
+        'accuracy': accuracy,
+        'avg_percent_error': average_percentage_error(predictions, actuals),
+        'seconds': time.perf_counter() - start_time,
+    }
+    return result, model.state_dict()
+
+
+# ===== Backtest =====
+series = {}
+
+
+def init_worker(values, target, threads):
+    torch.set_num_threads(threads)
+    series.update(values=values, target=target)
+
+
+def run_fold_in_worker(name, fold_index, fold, settings):
+    return run_fold(name, fold_index, fold, series['values'], series['target'], settings)[0]
+
+
+def print_fold(result):
+    print(f"Fold {result['fold']} (test rows {result['test_start']}-{result['test_end']}): {result['epochs']} epochs, "
+          f"test loss {result['test_loss']:.6f}, accuracy {result['accuracy']*100:.2f}%, "
+          f"avg error {result['avg_percent_error']:.4f}% ({result['seconds']:.1f}s)")
+
+
+# warm_start: each fold starts from the weights of the previous one and is fine-tuned, so the folds run in order.
+# Otherwise the folds are independent and run in parallel, in a process pool sharing the series tensors.
+def run_backtest(name, folds, values, target, settings, warm_start=True, workers=None, threads=1):
+    results = []
+    if warm_start:
+        state = None
+        for fold_index, fold in enumerate(folds):
+            result, state = run_fold(name, fold_index, fold, values, target, settings, state)
+            results.append(result)
+            print_fold(result)
+    else:
+        workers = workers or max(1, (os.cpu_count() or 1) // threads)
+        values.share_memory_()
+        target.share_memory_()
+        context = mp.get_context('spawn')
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=init_worker, initargs=(values, target, threads)) as executor:
+            futures = [executor.submit(run_fold_in_worker, name, fold_index, fold, settings) for fold_index, fold in enumerate(folds)]
+            for future in as_completed(futures):
+                results.append(future.result())
+                print_fold(results[-1])
+    return pd.DataFrame(results).sort_values('fold').reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Walk-forward backtest: retrain a model on rolling windows and test each on the following bars.')
+    parser.add_argument('--model', required=True, choices=list(SCRIPTS))
+    parser.add_argument('--file', default='XAU_1d_data.csv')
+    parser.add_argument('--train-size', type=int, default=2000, help='Training rows per fold')
+    parser.add_argument('--val-size', type=int, default=250, help='Validation rows per fold')
+    parser.add_argument('--test-size', type=int, default=250, help='Test rows per fold')
+    parser.add_argument('--step', type=int, help='Rows between the starts of two folds (default: test size)')
+    parser.add_argument('--expanding', action='store_true', help='Train every fold from the first row instead of a rolling window')
+    parser.add_argument('--cold-start', action='store_true', help='Train every fold from scratch, in parallel')
+    parser.add_argument('--workers', type=int, help='Folds trained in parallel with --cold-start (default: number of cores / threads)')
+    parser.add_argument('--threads', type=int, default=1, help='Torch threads per worker')
+    parser.add_argument('--epochs', type=int, default=300, help='Epochs of the first fold (of every fold with --cold-start)')
+    parser.add_argument('--finetune-epochs', type=int, default=100, help='Epochs of the warm-started folds')
+    parser.add_argument('--patience', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    values, target = load_series(args.file)
+    folds = walk_forward_folds(len(values), args.train_size, args.val_size, args.test_size, args.step, args.expanding)
+    if not folds:
+        parser.error(f"The file has only {len(values)} rows, fewer than one fold ({args.train_size + args.val_size + args.test_size})")
+    print(f"Backtesting {args.model} on {len(folds)} folds of {args.file} ({'cold start' if args.cold_start else 'warm start'})")
+
+    settings = {'epochs': args.epochs, 'finetune_epochs': args.finetune_epochs, 'patience': args.patience, 'seed': args.seed, 'threshold': 1}
+    start = time.perf_counter()
+    results = run_backtest(args.model, folds, values, target, settings, not args.cold_start, args.workers, args.threads)
+
+    output = root_dir / 'models' / 'backtest' / f'{args.model}_folds.csv'
+    output.parent.mkdir(parents=True, exist_ok=True)
+    results.to_csv(output, index=False)
+    print(f"\nBacktest finished in {time.perf_counter() - start:.1f}s")
+    print(f"Mean over {len(results)} folds: test loss {results['test_loss'].mean():.6f}, accuracy {results['accuracy'].mean()*100:.2f}%, "
+          f"avg error {results['avg_percent_error'].mean():.4f}%")
+    print(f"Results saved to {output}")
@@ -0,0 +1,142 @@
+import os
+import sys
+import json
+import numpy as np
+import torch
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from utils.paths import run_name
+
+
+# Detached copy of a (possibly nested) state dict, so it doesn't follow the live parameters
+def clone_state(state):
+    if isinstance(state, torch.Tensor):
+        return state.detach().clone()
+    if isinstance(state, dict):
+        return {key: clone_state(value) for key, value in state.items()}
+    if isinstance(state, (list, tuple)):
+        return type(state)(clone_state(value) for value in state)
+    return state
+
+
+# ===== Checkpoint Manager =====
+# Keeps the best weights in memory and writes checkpoints to disk on a background thread:
+#   model_path:             best model weights (plain state dict, as loaded by the scripts)
+#   <model_path>_last.pth:  full training state (model, optimizer, epoch, losses) to resume from
+class CheckpointManager:
+    def __init__(self, model_path, save_every=10):
+        self.model_path = Path(model_path)
+        self.last_path = self.model_path.with_name(self.model_path.stem + '_last' + self.model_path.suffix)
+        self.save_every = save_every
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending = []
+
+    # Write to a temporary file first, so a run killed while saving never leaves a corrupted checkpoint
+    @staticmethod
+    def _write(state, path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        torch.save(state, tmp_path)
+        os.replace(tmp_path, path)
+
+    def save_async(self, state, path):
+        self.pending = [future for future in self.pending if not future.done()]
+        self.pending.append(self.executor.submit(self._write, state, path))
+
+    def wait(self):
+        for future in self.pending:
+            future.result()
+        self.pending = []
+
+    def should_save(self, epoch):
+        return self.save_every > 0 and (epoch + 1) % self.save_every == 0
+
+    # The training state is copied here, on the training thread; only the serialization runs in the background
+    def save_training_state(self, model, optimizer, epoch, best_model_state, best_val_loss, epochs_no_improve,
+                            train_losses, val_losses, early_stopped=False):
+        state = {
+            'model': clone_state(model.state_dict()),
+            'optimizer': clone_state(optimizer.state_dict()),
+            'epoch': epoch,
+            'best_model_state': best_model_state,
+            'best_val_loss': best_val_loss,
+            'epochs_no_improve': epochs_no_improve,
+            'train_losses': list(train_losses),
+            'val_losses': list(val_losses),
+            'early_stopped': early_stopped,
+        }
+        self.save_async(state, self.last_path)
+        if best_model_state is not None:
+            self.save_async(best_model_state, self.model_path)
+
+    def load_training_state(self):
+        if not self.last_path.exists():
+            return None
+        return torch.load(self.last_path, weights_only=False)
+
+    # Synchronously write the best weights (after all the pending saves) and stop the background thread
+    def save_best(self, best_model_state):
+        self.wait()
+        if best_model_state is not None:
+            self._write(best_model_state, self.model_path)
+
+    def close(self):
+        self.wait()
+        self.executor.shutdown()
+
+
+# ===== Scalers =====
+# The fitted MinMaxScalers and the feature list are saved next to the weights (models/<name>_scalers.npz),
+# so that the model can be reused without reloading the dataset to refit them
+def scalers_path(model_path):
+    model_path = Path(model_path)
+    return model_path.with_name(run_name(model_path) + '_scalers.npz')
+
+
+# config: extra settings needed to use the model (e.g. seq_len and pred_len of the RNNs)
+def save_scalers(model_path, features, features_scaler, target_scaler=None, **config):
+    arrays = {
+        'features': np.array(features),
+        'features_min': features_scaler.min_,
+        'features_scale': features_scaler.scale_,
+        'config': np.array(json.dumps(config)),
+    }
+    if target_scaler is not None:
+        arrays['target_min'] = target_scaler.min_
+        arrays['target_scale'] = target_scaler.scale_
+    path = scalers_path(model_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(path, **arrays)
+
+
+# Same transform as a fitted MinMaxScaler (X * scale_ + min_), without needing sklearn to load it
+class FittedScaler:
+    def __init__(self, min_, scale_):
+        self.min_ = min_
+        self.scale_ = scale_
+
+    def transform(self, X):
+        X = np.array(X, dtype=np.float64)
+        X *= self.scale_
+        X += self.min_
+        return X
+
+    def inverse_transform(self, X):
+        X = np.array(X, dtype=np.float64)
+        X -= self.min_
+        X /= self.scale_
+        return X
+
+
+# Returns (features, features_scaler, target_scaler or None, config), or None if nothing was saved
+def load_scalers(model_path):
+    path = scalers_path(model_path)
+    if not path.exists():
+        return None
+    with np.load(path) as saved:
+        features = saved['features'].tolist()
+        features_scaler = FittedScaler(saved['features_min'], saved['features_scale'])
+        target_scaler = FittedScaler(saved['target_min'], saved['target_scale']) if 'target_min' in saved else None
+        config = json.loads(str(saved['config']))
+    return features, features_scaler, target_scaler, config
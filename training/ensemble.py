@@ -0,0 +1,294 @@
+import sys
+import copy
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn as nn
+from torch.func import stack_module_state, functional_call, vmap
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from training.checkpoint import save_scalers
+from training.scripts import SCRIPTS, load_script, is_recurrent
+from evaluation.metrics import inverse_transform, threshold_accuracy, average_percentage_error
+
+root_dir = Path(__file__).resolve().parent.parent
+models_dir = root_dir / 'models'
+
+
+# ===== Stacked Members =====
+# N copies of a model trained together: every parameter is stacked into one (N, ...) tensor (same names as in the
+# state dict of a single model), and a forward pass runs all the members on the same batch, returning (N, batch, ...).
+# The FullyConnected models are run with torch.func.vmap; nn.RNN has no vmap support, so the RNNs use a stacked
+# recurrence written with batched matrix products instead (same computation as nn.RNN followed by the Linear layer).
+class StackedModels:
+    def __init__(self, base, params, buffers=None):
+        self.base = copy.deepcopy(base).to('meta')
+        self.params = params
+        self.buffers = buffers or {}
+        rnn = getattr(base, 'rnn', None)
+        self.recurrent = isinstance(rnn, nn.RNN)
+        if self.recurrent:
+            self.num_layers = rnn.num_layers
+            self.activation = torch.tanh if rnn.nonlinearity == 'tanh' else torch.relu
+
+    @classmethod
+    def from_models(cls, models):
+        params, buffers = stack_module_state(models)
+        return cls(models[0], params, buffers)
+
+    def __len__(self):
+        return len(next(iter(self.params.values())))
+
+    def parameters(self):
+        return list(self.params.values())
+
+    def __call__(self, x):
+        if self.recurrent:
+            return self._rnn_forward(x)
+        return vmap(self._member_forward, in_dims=(0, 0, None))(self.params, self.buffers, x)
+
+    def _member_forward(self, params, buffers, x):
+        return functional_call(self.base, (params, buffers), (x,))
+
+    def _rnn_forward(self, x):
+        p = self.params
+        out = x
+        for layer in range(self.num_layers):
+            weight_ih, weight_hh = p[f'rnn.weight_ih_l{layer}'], p[f'rnn.weight_hh_l{layer}']
+            bias = (p[f'rnn.bias_ih_l{layer}'] + p[f'rnn.bias_hh_l{layer}'])[None, :, None, :]
+            # Input projection of all the time steps at once, time first so that each step is contiguous
+            # (the first layer input is shared by all the members)
+            equation = 'btf,nhf->tnbh' if layer == 0 else 'tnbf,nhf->tnbh'
+            projected = torch.einsum(equation, out, weight_ih) + bias
+            recurrent_weight = weight_hh.transpose(1, 2)
+            # unbind instead of indexing each step: the backward then builds one gradient instead of one per step
+            steps = projected.unbind(0)
+            h = self.activation(steps[0])
+            outputs = [h]
+            for step in steps[1:]:
+                h = self.activation(torch.baddbmm(step, h, recurrent_weight))
+                outputs.append(h)
+            out = torch.stack(outputs)
+        # Last hidden state -> Linear, shaped (N, batch, pred_len, 1) like the output of RNN
+        return torch.baddbmm(p['fc.bias'][:, None, :], h, p['fc.weight'].transpose(1, 2)).unsqueeze(-1)
+
+    # State dict of one member, loadable into a single model
+    def member_state(self, member):
+        state = {name: value[member].detach().clone() for name, value in self.params.items()}
+        state.update({name: value[member].clone() for name, value in self.buffers.items()})
+        return state
+
+    # Stack of the selected members only
+    def select(self, members):
+        params = {name: value.detach()[members].clone().requires_grad_() for name, value in self.params.items()}
+        buffers = {name: value[members].clone() for name, value in self.buffers.items()}
+        return StackedModels(self.base, params, buffers)
+
+
+# The optimizer of a smaller stack, keeping the optimizer state (e.g. the Adam moments) of the selected members
+def select_optimizer(optimizer, stack, selected, members):
+    new_optimizer = type(optimizer)(selected.parameters(), **optimizer.defaults)
+    for old, new in zip(stack.parameters(), selected.parameters()):
+        state = optimizer.state.get(old)
+        if state:
+            new_optimizer.state[new] = {key: value[members].clone() if torch.is_tensor(value) and value.dim() > 0 else value
+                                        for key, value in state.items()}
+    return new_optimizer
+
+
+# ===== Training the Ensemble =====
+# Same epoch loop as train_model, for all the members at once: each member gets its own loss (the sum of the member
+# losses is backpropagated, so the gradients of a member only depend on its own loss) and its own early stopping.
+# The optimizer (e.g. Adam) works element by element, so each member is updated exactly as if it was trained alone.
+# Members that stop early are removed from the stack, so the remaining ones train faster.
+# Returns the stacked best weights of every member and the per-member training history.
+def train_ensemble(stack, train_loader, val_loader, criterion, optimizer, num_epochs, patience):
+    member_criterion = copy.copy(criterion)
+    member_criterion.reduction = 'none'
+
+    def member_losses(output, yb):
+        return member_criterion(output, yb.expand_as(output)).flatten(1).mean(dim=1)
+
+    num_members = len(stack)
+    buffers = stack.buffers
+    active = torch.arange(num_members)    # Member of each slot of the stack
+    best_params = {name: value.detach().clone() for name, value in stack.params.items()}
+    best_val_losses = torch.full((num_members,), float('inf'))
+    epochs_no_improve = torch.zeros(num_members, dtype=torch.long)
+    history = {'train_losses': [[] for _ in range(num_members)], 'val_losses': [[] for _ in range(num_members)],
+               'best_epoch': [0] * num_members, 'stopped_epoch': [num_epochs] * num_members}
+
+    for epoch in range(num_epochs):
+        train_loss = torch.zeros(len(active))
+        for xb, yb in train_loader:
+            optimizer.zero_grad(set_to_none=True)
+            losses = member_losses(stack(xb), yb)
+            losses.sum().backward()
+            optimizer.step()
+            train_loss += losses.detach()
+        train_loss /= len(train_loader)
+
+        val_loss = torch.zeros(len(active))
+        with torch.no_grad():
+            for xb, yb in val_loader:
+                val_loss += member_losses(stack(xb), yb)
+        val_loss /= len(val_loader)
+
+        # Early stopping, member by member
+        improved = val_loss < best_val_losses[active]
+        for name, value in stack.params.items():
+            best_params[name][active[improved]] = value.detach()[improved]
+        best_val_losses[active[improved]] = val_loss[improved]
+        epochs_no_improve[active] = torch.where(improved, 0, epochs_no_improve[active] + 1)
+        for slot, member in enumerate(active.tolist()):
+            history['train_losses'][member].append(train_loss[slot].item())
+            history['val_losses'][member].append(val_loss[slot].item())
+            if improved[slot]:
+                history['best_epoch'][member] = epoch + 1
+
+        keep = epochs_no_improve[active] < patience
+        for member in active[~keep].tolist():
+            history['stopped_epoch'][member] = epoch + 1
+        print(f"Epoch {epoch+1}/{num_epochs}, {len(active)} members, Train Loss: {train_loss.mean():.6f}, "
+              f"Val Loss: {val_loss.mean():.6f} (mean), best Val Loss: {best_val_losses.min():.6f}")
+
+        if not keep.any():
+            print(f"All members stopped early at epoch {epoch+1}.")
+            break
+        if not keep.all():
+            slots = keep.nonzero().flatten()
+            selected = stack.select(slots)
+            optimizer = select_optimizer(optimizer, stack, selected, slots)
+            stack = selected
+            active = active[slots]
+            print(f"{num_members - len(active)} members stopped early, {len(active)} still training.")
+
+    return StackedModels(stack.base, best_params, buffers), history
+
+
+# ===== Ensemble Predictions =====
+# Predictions of every member, (N, samples) for single-step models and (N, samples, pred_len) for multi-step ones
+def predict_members(stack, loader):
+    with torch.no_grad():
+        outputs = [stack(xb).reshape(len(stack), len(xb), -1) for xb, _ in loader]
+        actuals = [yb.reshape(len(yb), -1) for _, yb in loader]
+    predictions, actuals = torch.cat(outputs, dim=1).double().numpy(), torch.cat(actuals).double().numpy()
+    if predictions.shape[2] == 1:
+        predictions, actuals = predictions[:, :, 0], actuals[:, 0]
+    return predictions, actuals
+
+
+# Mean prediction of the members and their spread (standard deviation) for every sample
+def ensemble_predictions(member_predictions):
+    return member_predictions.mean(axis=0), member_predictions.std(axis=0)
+
+
+def ensemble_path(name):
+    return models_dir / f'{name}_ensemble.pth'
+
+
+# Stacked members saved by the ensemble CLI, ready to predict
+def load_ensemble(name, path=None):
+    from inference.predict import build_model
+    saved = torch.load(path or ensemble_path(name), weights_only=False)
+    base = build_model(name, {key: value[0] for key, value in saved['params'].items()})
+    return StackedModels(base, saved['params'], saved.get('buffers')), saved
+
+
+# ===== Ensemble from a Training Script =====
+# Builds `members` models with the architecture and hyperparameters of the training script, each from its own seed
+def build_members(script, input_size, members, seed):
+    models = []
+    for member in range(members):
+        torch.manual_seed(seed + member)
+        model, criterion, optimizer = script.build_model(input_size)
+        models.append(model)
+    return models, criterion, optimizer
+
+
+def run_ensemble(name, members=32, seed=0, filename='XAU_1d_data.csv', num_epochs=None, patience=None, threshold=1):
+    script = load_script(name)
+    recurrent = is_recurrent(script)
+    if recurrent:
+        from data.RNN_data_processing import load_and_process_data
+        train_loader, val_loader, test_loader, features, _, features_scaler, target_scaler = load_and_process_data(
+            filename, script.seq_len, script.pred_len, script.batch_size)
+    else:
+        from data.MLP_data_processing import load_and_process_data
+        train_loader, val_loader, test_loader, features, _, features_scaler = load_and_process_data(filename, script.batch_size)
+        target_scaler = None
+
+    models, criterion, member_optimizer = build_members(script, len(features), members, seed)
+    stack = StackedModels.from_models(models)
+    optimizer = type(member_optimizer)(stack.parameters(), **member_optimizer.defaults)
+
+    start = time.perf_counter()
+    stack, history = train_ensemble(stack, train_loader, val_loader, criterion, optimizer,
+                                     num_epochs or script.num_epochs, patience or script.patience)
+    seconds = time.perf_counter() - start
+
+    # Test predictions of every member, their mean and spread
+    member_predictions, actuals = predict_members(stack, test_loader)
+    if target_scaler is not None:
+        member_predictions = inverse_transform(member_predictions, target_scaler)
+        actuals = inverse_transform(actuals, target_scaler)
+    mean, spread = ensemble_predictions(member_predictions)
+
+    member_metrics = pd.DataFrame([{
+        'member': member,
+        'seed': seed + member,
+        'best_epoch': history['best_epoch'][member],
+        'stopped_epoch': history['stopped_epoch'][member],
+        'best_val_loss': min(history['val_losses'][member]),
+        'accuracy': threshold_accuracy(member_predictions[member], actuals, threshold)[2] * 100,
+        'avg_percent_error': average_percentage_error(member_predictions[member], actuals),
+    } for member in range(members)])
+    summary = {
+        'members': members,
+        'seconds': seconds,
+        'epochs': sum(history['stopped_epoch']),
+        'accuracy': threshold_accuracy(mean, actuals, threshold)[2] * 100,
+        'avg_percent_error': average_percentage_error(mean, actuals),
+        'mean_spread': float(spread.mean()),
+    }
+
+    path = ensemble_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    torch.save({'model': name, 'params': stack.params, 'buffers': stack.buffers, 'seeds': list(range(seed, seed + members)),
+                'history': history}, path)
+    save_scalers(path, features, features_scaler, target_scaler,
+                 **({'seq_len': script.seq_len, 'pred_len': script.pred_len} if recurrent else {}))
+
+    columns = {'actual': actuals, 'mean': mean, 'spread': spread}
+    if mean.ndim == 1:
+        predictions = pd.DataFrame(columns)
+    else:
+        predictions = pd.DataFrame({f'{column}_t+{step + 1}': values[:, step] for column, values in columns.items() for step in range(mean.shape[1])})
+    return summary, member_metrics, predictions, path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train many seeds of a model together as one stacked ensemble and evaluate its mean prediction.')
+    parser.add_argument('--model', required=True, choices=list(SCRIPTS))
+    parser.add_argument('--members', type=int, default=32, help='Number of members (seeds) of the ensemble')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the first member (member i uses seed + i)')
+    parser.add_argument('--file', default='XAU_1d_data.csv')
+    parser.add_argument('--epochs', type=int, help='Maximum number of epochs (default: the one of the training script)')
+    parser.add_argument('--patience', type=int, help='Early stopping patience of each member (default: the one of the training script)')
+    parser.add_argument('--threshold', type=float, default=1, help='%% threshold of the accuracy')
+    args = parser.parse_args()
+
+    summary, member_metrics, predictions, path = run_ensemble(args.model, args.members, args.seed, args.file, args.epochs, args.patience, args.threshold)
+    print(f"\nTrained {summary['members']} members ({summary['epochs']} member-epochs) in {summary['seconds']:.1f}s")
+    print(f"Members - Accuracy: {member_metrics['accuracy'].mean():.4f}% ± {member_metrics['accuracy'].std():.4f}, "
+          f"Average % Error: {member_metrics['avg_percent_error'].mean():.4f}% ± {member_metrics['avg_percent_error'].std():.4f}")
+    print(f"Ensemble mean - Accuracy: {summary['accuracy']:.4f}% of correct predictions within {args.threshold}%, "
+          f"Average % Error: {summary['avg_percent_error']:.4f}%, average spread: {summary['mean_spread']:.4f}")
+
+    output = root_dir / 'predictions' / f'{args.model}_ensemble_test.csv'
+    output.parent.mkdir(parents=True, exist_ok=True)
+    predictions.to_csv(output, index=False)
+    member_metrics.to_csv(path.with_name(f'{args.model}_ensemble_members.csv'), index=False)
+    print(f"Ensemble saved to {path}, test predictions (mean and spread) to {output}")
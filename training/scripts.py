@@ -0,0 +1,22 @@
+import sys
+import importlib
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+# Training script of each model: its build_model() and settings (batch_size, lr, num_epochs, patience and, for the RNNs,
+# seq_len and pred_len) are reused by the backtest and the ensembles, so they always train the same models.
+# Importing a script only defines them (see MLP/MLP1.py).
+SCRIPTS = {
+    'MLP1': 'MLP.MLP1',
+    'MLP2': 'MLP.MLP2',
+    'RNN1': 'RNN.RNN_single',
+    'RNN2': 'RNN.RNN_multi',
+}
+
+
+def load_script(name):
+    return importlib.import_module(SCRIPTS[name])
+
+
+def is_recurrent(script):
+    return hasattr(script, 'seq_len')
@@ -0,0 +1,220 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import itertools
+import contextlib
+import pandas as pd
+import torch
+import torch.nn as nn
+import torch.optim as optim
+import torch.multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from statistics import median
+from torch.utils.data import TensorDataset
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from data.prepared_store import load_prepared
+from data.RNN_data_processing import FEATURES, SlidingWindowDataset, split_data
+from data.batching import TensorBatchLoader
+from MLP.MLP1_network import FullyConnected as FullyConnected1
+from MLP.MLP2_network import FullyConnected as FullyConnected2
+from RNN.RNN_network import RNN
+from training.trainer import train_model
+from evaluation.metrics import predict
+
+root_dir = Path(__file__).resolve().parent.parent
+
+# Default search spaces, built around the values used in the training scripts (override them with --space)
+SEARCH_SPACES = {
+    'MLP1': {'hidden_size': [32, 64, 128], 'lr': [0.0005, 0.001, 0.002], 'batch_size': [32, 64],
+             'activation': ['ELU', 'ReLU', 'LeakyReLU'], 'criterion': ['MSE', 'SmoothL1'], 'optimizer': ['Adam']},
+    'MLP2': {'hidden_size1': [64, 128], 'hidden_size2': [32, 64], 'lr': [0.0005, 0.001, 0.002], 'batch_size': [32, 64],
+             'activation': ['ReLU', 'LeakyReLU', 'ELU'], 'criterion': ['MSE', 'SmoothL1'], 'optimizer': ['Adam']},
+    'RNN': {'hidden_size': [32, 64, 128], 'num_layers': [1, 2], 'seq_len': [7, 14, 30], 'pred_len': [1],
+            'lr': [0.0005, 0.00075, 0.001], 'batch_size': [32], 'nonlinearity': ['tanh', 'relu'],
+            'criterion': ['MSE', 'SmoothL1'], 'optimizer': ['Adam']},
+}
+ACTIVATIONS = {'ReLU': nn.ReLU, 'LeakyReLU': nn.LeakyReLU, 'ELU': nn.ELU}
+CRITERIA = {'MSE': nn.MSELoss, 'SmoothL1': nn.SmoothL1Loss}
+OPTIMIZERS = {'Adam': optim.Adam, 'RMSprop': optim.RMSprop}
+
+
+# ===== Search Space =====
+# Every combination of the listed values, or a random subset of num_trials of them
+def sample_configs(space, num_trials=None, seed=0):
+    configs = [dict(zip(space, values)) for values in itertools.product(*space.values())]
+    if num_trials is not None and num_trials < len(configs):
+        configs = random.Random(seed).sample(configs, num_trials)
+    return configs
+
+
+# ===== Shared Dataset =====
+# The dataset is loaded, split and scaled once in the main process, like the data loaders do.
+# The arrays are moved to shared memory, so the workers all read the same copy instead of reloading it:
+# the MLPs use the features with the raw target, the RNNs the features with the scaled target,
+# and each trial builds its own windows / batches on top of them as views.
+def load_shared_data(filename):
+    from sklearn.preprocessing import MinMaxScaler
+    file_path = (root_dir / 'data' / 'dataset' / filename).as_posix()
+    training, validation, _ = split_data(load_prepared(file_path, list(FEATURES)))
+
+    features_scaler = MinMaxScaler().fit(training[FEATURES])
+    target_scaler = MinMaxScaler().fit(training[['future_close']])
+    data = {}
+    for split, frame in (('train', training), ('val', validation)):
+        data[f'{split}_x'] = torch.tensor(features_scaler.transform(frame[FEATURES]), dtype=torch.float32)
+        data[f'{split}_y'] = torch.tensor(frame[['future_close']].values, dtype=torch.float32)
+        data[f'{split}_y_scaled'] = torch.tensor(target_scaler.transform(frame[['future_close']]), dtype=torch.float32)
+    for tensor in data.values():
+        tensor.share_memory_()
+    return data
+
+
+# ===== Workers =====
+worker_state = {}
+
+
+def init_worker(data, history, lock, threads):
+    torch.set_num_threads(threads)
+    worker_state.update(data=data, history=history, lock=lock)
+
+
+def build_trial(model_name, params):
+    data = worker_state['data']
+    batch_size = params['batch_size']
+    if model_name == 'RNN':
+        train_dataset = SlidingWindowDataset(data['train_x'], data['train_y_scaled'], params['seq_len'], params['pred_len'])
+        val_dataset = SlidingWindowDataset(data['val_x'], data['val_y_scaled'], params['seq_len'], params['pred_len'])
+        model = RNN(len(FEATURES), params['hidden_size'], params['num_layers'], params['pred_len'], params['nonlinearity'])
+    else:
+        train_dataset = TensorDataset(data['train_x'], data['train_y'])
+        val_dataset = TensorDataset(data['val_x'], data['val_y'])
+        activation = ACTIVATIONS[params['activation']]
+        if model_name == 'MLP1':
+            model = FullyConnected1(len(FEATURES), params['hidden_size'], 1, activation)
+        else:
+            model = FullyConnected2(len(FEATURES), params['hidden_size1'], params['hidden_size2'], 1, activation)
+    train_loader = TensorBatchLoader(train_dataset, batch_size)
+    val_loader = TensorBatchLoader(val_dataset, batch_size)
+    return model, train_loader, val_loader
+
+
+# Median pruning: after the warm-up epochs, a trial stops when its best val loss so far is worse than the median
+# of the best val losses the other trials had at the same epoch. Only trials with the same criterion are compared.
+def median_pruner(group, warmup, min_trials):
+    best = float('inf')
+
+    def on_epoch_end(epoch, train_loss, val_loss):
+        nonlocal best
+        best = min(best, val_loss)
+        history, lock = worker_state['history'], worker_state['lock']
+        with lock:
+            others = history.get((group, epoch), [])
+            history[(group, epoch)] = others + [best]
+        return epoch + 1 >= warmup and len(others) >= min_trials and best > median(others)
+
+    return on_epoch_end
+
+
+def run_trial(trial, model_name, params, settings):
+    torch.manual_seed(settings['seed'] + trial)
+    start = time.perf_counter()
+    model, train_loader, val_loader = build_trial(model_name, params)
+    criterion = CRITERIA[params['criterion']]()
+    optimizer = OPTIMIZERS[params['optimizer']](model.parameters(), params['lr'])
+    model_path = (root_dir / 'models' / 'sweep' / model_name / f'trial_{trial}_model.pth').as_posix()
+
+    pruned = []
+    pruner = median_pruner(params['criterion'], settings['prune_warmup'], settings['prune_min_trials'])
+
+    def on_epoch_end(epoch, train_loss, val_loss):
+        if pruner(epoch, train_loss, val_loss):
+            pruned.append(epoch + 1)
+            return True
+        return False
+
+    # The epoch logs of parallel trials would be interleaved, only the summary of each trial is printed
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        train_losses, val_losses = train_model(model, train_loader, val_loader, criterion, optimizer, settings['epochs'],
+                                               settings['patience'], model_path, checkpoint_every=0, on_epoch_end=on_epoch_end)
+
+    best_epoch = min(range(len(val_losses)), key=val_losses.__getitem__)
+    # The val losses of different criteria (MSE, SmoothL1) are not comparable: the trials are ranked on the val MSE
+    # of their best weights, over all the validation samples
+    model.load_state_dict(torch.load(model_path, weights_only=False))
+    predictions, actuals, _ = predict(model, val_loader, criterion)
+    val_mse = float(((predictions - actuals) ** 2).mean())
+    if pruned:
+        status = 'pruned'
+    elif len(val_losses) < settings['epochs']:
+        status = 'early_stopped'
+    else:
+        status = 'completed'
+    return {'trial': trial, **params, 'best_val_loss': val_losses[best_epoch], 'val_mse': val_mse, 'best_epoch': best_epoch + 1,
+            'epochs': len(val_losses), 'status': status, 'seconds': time.perf_counter() - start, 'model_path': model_path}
+
+
+# ===== Sweep =====
+# Trials run in parallel in a process pool, each process limited to `threads` intra-op threads
+def run_sweep(model_name, configs, filename='XAU_1d_data.csv', workers=None, threads=1, epochs=200, patience=30,
+              prune_warmup=10, prune_min_trials=3, seed=0):
+    workers = workers or max(1, (os.cpu_count() or 1) // threads)
+    settings = {'epochs': epochs, 'patience': patience, 'prune_warmup': prune_warmup, 'prune_min_trials': prune_min_trials, 'seed': seed}
+    data = load_shared_data(filename)
+
+    # Spawned workers receive the shared tensors as handles to the same memory
+    context = mp.get_context('spawn')
+    results = []
+    with context.Manager() as manager:
+        history, lock = manager.dict(), manager.Lock()
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=init_worker, initargs=(data, history, lock, threads)) as executor:
+            futures = {executor.submit(run_trial, trial, model_name, params, settings): trial for trial, params in enumerate(configs)}
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as error:
+                    print(f"Trial {futures[future]} failed: {error}")
+                    continue
+                results.append(result)
+                print(f"Trial {result['trial']} ({len(results)}/{len(configs)}): {result['status']} after {result['epochs']} epochs, "
+                      f"best val loss {result['best_val_loss']:.6f}, val MSE {result['val_mse']:.6f} ({result['seconds']:.1f}s)")
+
+    return pd.DataFrame(results).sort_values('val_mse').reset_index(drop=True) if results else pd.DataFrame()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train many hyperparameter configurations in parallel and rank them by validation MSE.')
+    parser.add_argument('--model', required=True, choices=list(SEARCH_SPACES))
+    parser.add_argument('--file', default='XAU_1d_data.csv')
+    parser.add_argument('--space', help='JSON file mapping each hyperparameter to the list of values to try (default: SEARCH_SPACES)')
+    parser.add_argument('--trials', type=int, help='Number of random configurations to try (default: all of them)')
+    parser.add_argument('--workers', type=int, help='Trials run in parallel (default: number of cores / threads)')
+    parser.add_argument('--threads', type=int, default=1, help='Torch threads per worker')
+    parser.add_argument('--epochs', type=int, default=200)
+    parser.add_argument('--patience', type=int, default=30)
+    parser.add_argument('--prune-warmup', type=int, default=10, help='Epochs before a trial can be pruned')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Results table (default: models/sweep/<model>_results.csv)')
+    args = parser.parse_args()
+
+    space = dict(SEARCH_SPACES[args.model])
+    if args.space:
+        with open(args.space) as f:
+            space.update(json.load(f))
+    configs = sample_configs(space, args.trials, args.seed)
+    print(f"Sweeping {len(configs)} configurations of {args.model}")
+
+    start = time.perf_counter()
+    results = run_sweep(args.model, configs, args.file, args.workers, args.threads, args.epochs, args.patience, args.prune_warmup, seed=args.seed)
+    print(f"\nSweep finished in {time.perf_counter() - start:.1f}s")
+    if results.empty:
+        sys.exit(f"All the {len(configs)} trials failed, no results to save")
+
+    output = Path(args.output) if args.output else root_dir / 'models' / 'sweep' / f'{args.model}_results.csv'
+    output.parent.mkdir(parents=True, exist_ok=True)
+    results.to_csv(output, index=False)
+    print(results.drop(columns='model_path').head(10).to_string(index=False))
+    print(f"Results saved to {output}")
@@ -0,0 +1,122 @@
+import sys
+import torch
+from contextlib import nullcontext
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from training.checkpoint import CheckpointManager, clone_state
+from utils.profiling import RunProfiler, trace_path
+
+
+# ===== Training the Model =====
+# Shared epoch loop with early stopping and checkpointing, used by all the models.
+# Losses are accumulated on the device and synchronized once per epoch.
+#   amp: run the forward pass under bfloat16 autocast (CPU or GPU)
+#   compile_model: run the forward pass through torch.compile
+#   accumulation_steps: number of batches whose gradients are accumulated before each optimizer step
+#   checkpoint_every: save the best weights and the training state every N epochs (in the background)
+#   resume: continue from the last saved training state of model_path, if there is one
+#   on_epoch_end: called as on_epoch_end(epoch, train_loss, val_loss) after every epoch, returning True stops training
+#   profiler: RunProfiler recording the time, throughput and memory of every epoch (see utils/profiling.py)
+def train_model(model, train_loader, val_loader, criterion, optimizer, num_epochs, patience, model_path,
+                amp=False, compile_model=False, accumulation_steps=1, checkpoint_every=10, resume=False, on_epoch_end=None,
+                profiler=None):
+    train_losses = []
+    val_losses = []
+    best_val_loss = float('inf')
+    epochs_no_improve = 0
+    best_model_state = None
+    start_epoch = 0
+    early_stopped = False
+
+    checkpoints = CheckpointManager(model_path, save_every=checkpoint_every)
+    state = checkpoints.load_training_state() if resume else None
+    if state is not None:
+        model.load_state_dict(state['model'])
+        optimizer.load_state_dict(state['optimizer'])
+        start_epoch = state['epoch']
+        best_model_state = state['best_model_state']
+        best_val_loss = state['best_val_loss']
+        epochs_no_improve = state['epochs_no_improve']
+        train_losses = state['train_losses']
+        val_losses = state['val_losses']
+        early_stopped = state['early_stopped']
+        print(f"Resumed training from epoch {start_epoch}.")
+
+    profiler = profiler or RunProfiler(enabled=False)
+    device = next(model.parameters()).device
+    forward = torch.compile(model) if compile_model else model
+
+    def autocast():
+        return torch.autocast(device_type=device.type, dtype=torch.bfloat16) if amp else nullcontext()
+
+    # A run that already stopped early is not trained any further
+    if early_stopped:
+        start_epoch = num_epochs
+
+    for epoch in range(start_epoch, num_epochs):
+        epoch_record = profiler.start_epoch(epoch)
+        model.train()
+        train_loss = torch.zeros((), device=device)
+        optimizer.zero_grad(set_to_none=True)
+        for step, (xb, yb) in enumerate(profiler.iterate(train_loader, epoch_record), 1):
+            with autocast():
+                output = forward(xb)
+                loss = criterion(output.float(), yb)
+            (loss / accumulation_steps).backward()
+            if step % accumulation_steps == 0 or step == len(train_loader):
+                optimizer.step()
+                optimizer.zero_grad(set_to_none=True)
+            train_loss += loss.detach()
+
+        train_loss = train_loss.item() / len(train_loader)
+        train_losses.append(train_loss)
+        profiler.lap(epoch_record, 'train')
+
+        model.eval()
+        val_loss = torch.zeros((), device=device)
+        with torch.no_grad():
+            for xb, yb in val_loader:
+                with autocast():
+                    output = forward(xb)
+                    loss = criterion(output.float(), yb)
+                val_loss += loss
+
+        val_loss = val_loss.item() / len(val_loader)
+        val_losses.append(val_loss)
+        profiler.lap(epoch_record, 'val')
+        profiler.end_epoch(epoch_record, trace_path(model_path))
+
+        print(f"Epoch {epoch+1}/{num_epochs}, Train Loss: {train_loss:.6f}, Val Loss: {val_loss:.6f}")
+
+        # Early stopping
+        if val_loss < best_val_loss:
+            best_val_loss = val_loss
+            epochs_no_improve = 0
+            best_model_state = clone_state(model.state_dict())
+            print("New best val_loss. Model weights saved in memory.")
+        else:
+            epochs_no_improve += 1
+            print(f"No improvement: {epochs_no_improve}/{patience}")
+            if epochs_no_improve >= patience:
+                print(f"Early stopping triggered at epoch {epoch+1}.")
+                early_stopped = True
+
+        # Stopped from outside (e.g. a hyperparameter sweep pruning the run)
+        if not early_stopped and on_epoch_end is not None and on_epoch_end(epoch, train_loss, val_loss):
+            print(f"Training stopped at epoch {epoch+1}.")
+            early_stopped = True
+
+        # Periodic checkpoint (and a last one when training ends), written on a background thread
+        if early_stopped or epoch + 1 == num_epochs or checkpoints.should_save(epoch):
+            checkpoints.save_training_state(model, optimizer, epoch + 1, best_model_state, best_val_loss, epochs_no_improve,
+                                            train_losses, val_losses, early_stopped)
+        if early_stopped:
+            break
+
+    # Model checkpointing
+    checkpoints.save_best(best_model_state)
+    checkpoints.close()
+    if best_model_state is not None:
+        print("Best model weights saved to disk.")
+
+    return train_losses, val_losses
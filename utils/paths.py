@@ -0,0 +1,7 @@
+from pathlib import Path
+
+
+# <name> of a checkpoint models/<name>_model.pth: the files of a run are saved next to it as models/<name>_<kind>.<ext>
+def run_name(model_path):
+    stem = Path(model_path).stem
+    return stem[:-len('_model')] if stem.endswith('_model') else stem
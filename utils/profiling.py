@@ -0,0 +1,204 @@
+import os
+import sys
+import json
+import time
+import platform
+import torch
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from utils.paths import run_name
+
+try:
+    import resource
+except ImportError:    # Not available on Windows
+    resource = None
+
+
+# ===== Memory =====
+def current_rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def _synchronize():
+    if torch.cuda.is_available() and torch.cuda.is_initialized():
+        torch.cuda.synchronize()
+
+
+# Versions and hardware a run was made with, to compare reports between machines
+def environment():
+    return {
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'torch_threads': torch.get_num_threads(),
+        'cpu_count': os.cpu_count(),
+        'cuda': torch.cuda.get_device_name() if torch.cuda.is_available() else None,
+    }
+
+
+# ===== Run Profiler =====
+# Records wall time, throughput and memory of the phases of a run (loading, scaling, training, testing...) and of every epoch,
+# and writes them as a JSON report next to the checkpoint (models/<name>_profile.json).
+# trace_epochs: (first, last) epochs (1-based, inclusive) to record with the torch profiler, one Chrome trace per epoch.
+# A disabled profiler does nothing, so the code can always call it.
+class RunProfiler:
+    def __init__(self, enabled=True, trace_epochs=None):
+        self.enabled = enabled
+        self.trace_epochs = trace_epochs
+        self.started = time.time()
+        self.start_time = time.perf_counter()
+        self.phases = []
+        self.epochs = []
+        self.traces = []
+        self.torch_profiler = None
+
+    # Time a block of code; samples (if known, or set on the yielded record) gives the samples/sec
+    @contextmanager
+    def phase(self, name, samples=None):
+        if not self.enabled:
+            yield {}
+            return
+        record = {'name': name, 'samples': samples}
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            _synchronize()
+            record['seconds'] = time.perf_counter() - start
+            if record['samples']:
+                record['samples_per_sec'] = record['samples'] / record['seconds']
+            record['rss_mb'] = current_rss_mb()
+            record['peak_rss_mb'] = peak_rss_mb()
+            self.phases.append(record)
+
+    # ===== Epochs =====
+    # Per epoch: training time (split between waiting for the batches and computing), validation time, throughput and memory
+    def start_epoch(self, epoch):
+        if not self.enabled:
+            return None
+        record = {'epoch': epoch + 1, 'samples': 0, 'data_seconds': 0.0}
+        if self.trace_epochs is not None and self.trace_epochs[0] <= epoch + 1 <= self.trace_epochs[1]:
+            self.torch_profiler = torch.profiler.profile(record_shapes=True)
+            self.torch_profiler.__enter__()
+        record['start'] = record['last'] = time.perf_counter()
+        return record
+
+    # Iterate over a loader, timing how long each batch takes to arrive and counting the samples
+    def iterate(self, loader, record):
+        if record is None:
+            yield from loader
+            return
+        iterator = iter(loader)
+        while True:
+            start = time.perf_counter()
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                return
+            record['data_seconds'] += time.perf_counter() - start
+            record['samples'] += len(batch[0])
+            yield batch
+
+    # Time since the previous lap (or the start of the epoch), saved as <name>_seconds
+    def lap(self, record, name):
+        if record is None:
+            return
+        _synchronize()
+        now = time.perf_counter()
+        record[f'{name}_seconds'] = now - record['last']
+        record['last'] = now
+
+    def end_epoch(self, record, trace_path=None):
+        if record is None:
+            return
+        start, last = record.pop('start'), record.pop('last')
+        record['seconds'] = last - start
+        if 'train_seconds' in record:
+            record['compute_seconds'] = record['train_seconds'] - record['data_seconds']
+            record['samples_per_sec'] = record['samples'] / record['train_seconds'] if record['train_seconds'] else None
+        record['rss_mb'] = current_rss_mb()
+        record['peak_rss_mb'] = peak_rss_mb()
+        self.epochs.append(record)
+
+        if self.torch_profiler is not None:
+            self.torch_profiler.__exit__(None, None, None)
+            if trace_path is not None:
+                path = Path(trace_path)
+                path = path.with_name(f'{path.stem}_epoch{record["epoch"]}.json')
+                path.parent.mkdir(parents=True, exist_ok=True)
+                self.torch_profiler.export_chrome_trace(path.as_posix())
+                self.traces.append(path.as_posix())
+            self.torch_profiler = None
+
+    # ===== Report =====
+    def report(self):
+        epoch_seconds = [epoch['seconds'] for epoch in self.epochs]
+        throughputs = [epoch['samples_per_sec'] for epoch in self.epochs if epoch.get('samples_per_sec')]
+        peaks = [record['peak_rss_mb'] for record in self.phases + self.epochs if record.get('peak_rss_mb') is not None]
+        return {
+            'started': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started)),
+            'total_seconds': time.perf_counter() - self.start_time,
+            'environment': environment(),
+            'summary': {
+                'epochs': len(self.epochs),
+                'mean_epoch_seconds': sum(epoch_seconds) / len(epoch_seconds) if epoch_seconds else None,
+                'mean_samples_per_sec': sum(throughputs) / len(throughputs) if throughputs else None,
+                'peak_rss_mb': max(peaks) if peaks else None,
+            },
+            'phases': self.phases,
+            'epochs': self.epochs,
+            'traces': self.traces,
+        }
+
+    # Write the report next to the checkpoint and print where the time went
+    def save(self, model_path):
+        if not self.enabled:
+            return None
+        report = self.report()
+        path = profile_path(model_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+        print(f"\nProfile ({report['total_seconds']:.2f}s in total):")
+        for record in self.phases:
+            throughput = f", {record['samples_per_sec']:.0f} samples/s" if record.get('samples_per_sec') else ''
+            print(f"  {record['name']}: {record['seconds']:.3f}s{throughput}")
+        summary = report['summary']
+        if summary['epochs']:
+            print(f"  {summary['epochs']} epochs, {summary['mean_epoch_seconds']:.3f}s and {summary['mean_samples_per_sec']:.0f} samples/s on average")
+        if summary['peak_rss_mb'] is not None:
+            print(f"  Peak RSS: {summary['peak_rss_mb']:.0f} MB")
+        print(f"Profile saved to {path}")
+        return path
+
+
+# models/<name>_profile.json and models/<name>_trace.json (as <name>_trace_epoch<N>.json) for models/<name>_model.pth
+def _run_file(model_path, kind):
+    model_path = Path(model_path)
+    return model_path.with_name(f'{run_name(model_path)}_{kind}.json')
+
+
+def profile_path(model_path):
+    return _run_file(model_path, 'profile')
+
+
+def trace_path(model_path):
+    return _run_file(model_path, 'trace')
+
+
+# Phase context of an optional profiler
+def profile_phase(profiler, name, samples=None):
+    return profiler.phase(name, samples) if profiler is not None else nullcontext({})